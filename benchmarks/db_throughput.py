@@ -0,0 +1,134 @@
+"""Measure database write throughput with many tables writing at once.
+
+Usage:
+    python3 benchmarks/db_throughput.py [--processes 2] [--tables 8] [--actions 200]
+
+Each table is a thread that, per action, opens an app context, reads a
+player, updates its chips, inserts a chat message and commits -- the
+shape of a player action or a background write. --processes worker
+processes run that many tables each against one database file.
+
+Runs twice on fresh databases: once with SQLite's own defaults (rollback
+journal, synchronous=FULL, no mmap, 2 MB cache) and once with the
+settings from db_config.py, and reports commits per second and commit
+latency for both.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SQLite's defaults, i.e. what every connection got before db_config.py
+BASELINE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT': '5000',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_CACHE_SIZE': '-2000',
+    'SQLITE_TEMP_STORE': 'DEFAULT',
+    'DB_POOL_SIZE': '5',
+    'DB_MAX_OVERFLOW': '10',
+}
+
+def import_app():
+    os.environ.setdefault('SECRET_KEY', 'db-throughput')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('TIMER_BACKGROUND', 'false')
+    os.environ['SQL_STATS_LOG_INTERVAL'] = '0'
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+    import main
+    return main
+
+def setup(players):
+    main = import_app()
+    from src.models import db
+    from src.models.models import Player
+    with main.app.app_context():
+        db.session.add_all([Player(session_id=f'bench-{i}', username=f'bench{i}', chips=1000)
+                            for i in range(players)])
+        db.session.commit()
+
+def run_tables(first_player, tables, actions):
+    main = import_app()
+    from src.models import db
+    from src.models.models import Player, ChatMessage
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def table(player_id):
+        mine = []
+        for i in range(actions):
+            try:
+                with main.app.app_context():
+                    player = db.session.get(Player, player_id)
+                    player.chips += 1
+                    db.session.add(ChatMessage(player_id=player_id, game_id=player_id, message=f'action {i}'))
+                    started = time.perf_counter()
+                    db.session.commit()
+                    mine.append(time.perf_counter() - started)
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+        with lock:
+            latencies.extend(mine)
+
+    # Player ids start at 1
+    threads = [threading.Thread(target=table, args=(first_player + i + 1,)) for i in range(tables)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({'elapsed': time.perf_counter() - started, 'latencies': latencies, 'errors': errors}))
+
+def child(args, env, *extra):
+    return subprocess.Popen([sys.executable, __file__, *extra, '--tables', str(args.tables),
+                             '--actions', str(args.actions)], env=env, stdout=subprocess.PIPE, text=True)
+
+def measure(args, settings):
+    env = dict(os.environ, **settings,
+               DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'throughput.db'))
+    env.pop('DATABASE_INSTANCE', None)
+    players = args.processes * args.tables
+    if child(args, env, '--setup', str(players)).wait() != 0:
+        sys.exit('Setup failed')
+
+    workers = [child(args, env, '--first-player', str(i * args.tables)) for i in range(args.processes)]
+    results = [json.loads(worker.communicate()[0].strip().splitlines()[-1]) for worker in workers]
+
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    elapsed = max(result['elapsed'] for result in results)
+    errors = sum(len(result['errors']) for result in results)
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+    return len(latencies) / elapsed, percentile(0.5), percentile(0.99), errors
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--tables', type=int, default=8, help='tables (threads) per process')
+    parser.add_argument('--actions', type=int, default=200, help='commits per table')
+    parser.add_argument('--setup', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--first-player', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup is not None:
+        return setup(args.setup)
+    if args.first_player is not None:
+        return run_tables(args.first_player, args.tables, args.actions)
+
+    print(f'{args.processes} processes x {args.tables} tables x {args.actions} commits')
+    for name, settings in (('sqlite defaults', BASELINE), ('db_config.py', {})):
+        rate, p50, p99, errors = measure(args, settings)
+        print(f'{name:>16}: {rate:7.0f} commits/s, p50 {p50:6.2f} ms, p99 {p99:7.2f} ms, {errors} errors')
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,221 @@
+"""Benchmark and exhaustive correctness check for the hand evaluators.
+
+Usage:
+    python3 benchmarks/evaluator_bench.py [--hands 20000] [--seed 1]
+        [--skip-exhaustive] [--skip-legacy-exhaustive] [--output bench_results.json]
+
+Times poker.get_best_hand/calculate_hand_strength (legacy, dict cards),
+evaluator.evaluate_hand and the hand cache on a fixed random corpus of
+7-card hands, then checks every one of the 2,598,960 five-card hands
+against an independent reference ranking. Results are written as JSON.
+Exits with status 1 if the evaluator disagrees with the reference.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import Counter
+from itertools import combinations
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import poker
+from card_utils import card_to_dict
+from evaluator import evaluate_hand
+from hand_cache import HandCache
+
+CARD_DICTS = [card_to_dict(card) for card in range(52)]
+CARD_VALUES = [card % 13 + 2 for card in range(52)]
+CARD_SUITS = [card // 13 for card in range(52)]
+
+DISTINCT_FIVE_CARD_CLASSES = 7462
+
+def reference_rank(cards):
+    """Straightforward 5-card ranking: (category, tie-break values)."""
+    values = sorted((CARD_VALUES[card] for card in cards), reverse=True)
+    is_flush = len({CARD_SUITS[card] for card in cards}) == 1
+
+    distinct = sorted(set(values), reverse=True)
+    straight_high = 0
+    if len(distinct) == 5 and distinct[0] - distinct[4] == 4:
+        straight_high = distinct[0]
+    elif distinct == [14, 5, 4, 3, 2]:
+        straight_high = 5
+
+    groups = sorted(Counter(values).items(), key=lambda item: (item[1], item[0]), reverse=True)
+    shape = [count for _, count in groups]
+    grouped_values = tuple(value for value, _ in groups)
+
+    if straight_high and is_flush:
+        return (10 if straight_high == 14 else 9, (straight_high,))
+    if shape == [4, 1]:
+        return (8, grouped_values)
+    if shape == [3, 2]:
+        return (7, grouped_values)
+    if is_flush:
+        return (6, tuple(values))
+    if straight_high:
+        return (5, (straight_high,))
+    if shape == [3, 1, 1]:
+        return (4, grouped_values)
+    if shape == [2, 2, 1]:
+        return (3, grouped_values)
+    if shape == [2, 1, 1, 1]:
+        return (2, grouped_values)
+    return (1, tuple(values))
+
+def legacy_strength(cards):
+    """poker.calculate_hand_strength for int cards."""
+    hand_rank, high_cards = poker.get_best_hand([CARD_DICTS[card] for card in cards])
+    return poker.encode_strength(hand_rank, high_cards)
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def time_calls(name, func, corpus):
+    """Time func on every hand of the corpus, one call at a time."""
+    timings = []
+    perf_counter_ns = time.perf_counter_ns
+    for cards in corpus:
+        start = perf_counter_ns()
+        func(cards)
+        timings.append(perf_counter_ns() - start)
+    timings.sort()
+    total = sum(timings)
+    result = {
+        'name': name,
+        'hands': len(corpus),
+        'hands_per_sec': len(corpus) / (total / 1e9) if total else 0.0,
+        'mean_us': total / len(corpus) / 1e3,
+        'p50_us': percentile(timings, 0.50) / 1e3,
+        'p99_us': percentile(timings, 0.99) / 1e3,
+        'max_us': timings[-1] / 1e3,
+    }
+    print(f"{name:<28} {result['hands_per_sec']:>12,.0f} hands/s"
+          f"  p50 {result['p50_us']:8.2f}us  p99 {result['p99_us']:8.2f}us")
+    return result
+
+def run_benchmarks(num_hands, seed):
+    rng = random.Random(seed)
+    deck = list(range(52))
+    corpus = [rng.sample(deck, 7) for _ in range(num_hands)]
+    dict_corpus = [[CARD_DICTS[card] for card in cards] for cards in corpus]
+
+    cache = HandCache(num_hands)
+    results = [
+        time_calls('poker.get_best_hand', poker.get_best_hand, dict_corpus),
+        time_calls('poker.calculate_hand_strength', poker.calculate_hand_strength, dict_corpus),
+        time_calls('evaluator.evaluate_hand', evaluate_hand, corpus),
+        time_calls('hand_cache (cold)', cache.strength, corpus),
+        time_calls('hand_cache (warm)', cache.strength, corpus),
+    ]
+
+    # The corpus is also a cross-check between the legacy and new evaluators
+    disagreements = 0
+    for cards in corpus[:2000]:
+        legacy_category = poker.get_best_hand([CARD_DICTS[card] for card in cards])[0]
+        if legacy_category != evaluate_hand(cards) >> 20:
+            disagreements += 1
+
+    return {'corpus_seed': seed, 'results': results, 'category_disagreements_first_2000': disagreements}
+
+def check_ordering(name, strength_func, max_examples=10):
+    """Compare strength_func against reference_rank on every 5-card hand.
+
+    Hands with equal reference rank must get equal strengths, and strengths
+    must increase strictly with the reference rank.
+    """
+    start = time.perf_counter()
+    class_strengths = {}
+    split_classes = set()
+    for cards in combinations(range(52), 5):
+        rank = reference_rank(cards)
+        strength = strength_func(cards)
+        previous = class_strengths.setdefault(rank, strength)
+        if previous != strength:
+            split_classes.add(rank)
+
+    ordered = sorted(class_strengths.items())
+    inversions = []
+    collisions = []
+    for (lower_rank, lower), (higher_rank, higher) in zip(ordered, ordered[1:]):
+        if higher < lower:
+            inversions.append((lower_rank, higher_rank))
+        elif higher == lower:
+            collisions.append((lower_rank, higher_rank))
+
+    # Inversions between non-adjacent classes (e.g. a strength that jumps
+    # far ahead) show up as a strength seen out of sorted order.
+    out_of_order = 0
+    best = None
+    for _, strength in ordered:
+        if best is not None and strength < best:
+            out_of_order += 1
+        best = strength if best is None else max(best, strength)
+
+    def describe(pairs):
+        return [{
+            'lower': {'category': lower[0], 'values': list(lower[1]), 'strength': class_strengths[lower]},
+            'higher': {'category': higher[0], 'values': list(higher[1]), 'strength': class_strengths[higher]},
+        } for lower, higher in pairs[:max_examples]]
+
+    result = {
+        'name': name,
+        'hands': 2_598_960,
+        'reference_classes': len(class_strengths),
+        'split_classes': len(split_classes),
+        'adjacent_inversions': len(inversions),
+        'out_of_order_classes': out_of_order,
+        'collisions': len(collisions),
+        'inversion_examples': describe(inversions),
+        'collision_examples': describe(collisions),
+        'seconds': time.perf_counter() - start,
+    }
+    result['ok'] = (
+        result['reference_classes'] == DISTINCT_FIVE_CARD_CLASSES
+        and not split_classes and not inversions and not collisions and not out_of_order
+    )
+    print(f"{name:<28} {'OK' if result['ok'] else 'FAIL'}: {len(inversions)} inversions,"
+          f" {len(collisions)} collisions, {len(split_classes)} split classes"
+          f" ({result['seconds']:.1f}s)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hands', type=int, default=20_000, help='size of the random 7-card corpus')
+    parser.add_argument('--seed', type=int, default=1, help='corpus seed')
+    parser.add_argument('--skip-exhaustive', action='store_true', help='skip the 5-card oracle check')
+    parser.add_argument('--skip-legacy-exhaustive', action='store_true',
+                        help='skip the oracle check of the legacy base-10 encoding')
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file')
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmark': run_benchmarks(args.hands, args.seed),
+        'exhaustive': [],
+    }
+
+    ok = True
+    if not args.skip_exhaustive:
+        evaluator_check = check_ordering('evaluator.evaluate_hand', evaluate_hand)
+        report['exhaustive'].append(evaluator_check)
+        ok = evaluator_check['ok']
+        if not args.skip_legacy_exhaustive:
+            # Expected to fail: kicker digits overflow into each other in base 10
+            report['exhaustive'].append(check_ordering('poker (base-10 encoding)', legacy_strength))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Measure hand history export speed and memory as the history grows.
+
+Usage:
+    python3 benchmarks/export_history.py [--hands 20000 100000] [--players 3]
+
+Fills a fresh database with that many finished hands (and their
+hand_players and game_players rows), then, in a fresh process each,
+exports them with src/export_history.py and loads them the way the
+analytics scripts did (Model.query.all() per table). Reports rows per
+second and each process's peak memory, which for the export should stay
+flat as the history grows.
+"""
+import argparse
+import os
+import random
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+
+def setup_env(directory):
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'export.db')
+    os.environ.pop('DATABASE_INSTANCE', None)
+    sys.path.insert(0, SRC)
+
+def fill(hands, players):
+    import export_history
+    from sqlalchemy import insert
+    from src.models import db
+    from src.models.models import Player, Table, Game, GamePlayer, Hand, HandPlayer
+    from card_utils import cards_to_string
+
+    rng = random.Random(1)
+    start = datetime.utcnow() - timedelta(days=1)
+    app = export_history.create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Player), [{'session_id': f'bench-{i}', 'username': f'bench{i}'}
+                                            for i in range(players)])
+        db.session.execute(insert(Table), [{'name': 'Bench', 'min_chips': 0}])
+        db.session.execute(insert(Game), [{'table_id': 1}])
+        db.session.execute(insert(GamePlayer), [{'game_id': 1, 'player_id': i + 1, 'seat_position': i,
+                                                 'initial_chips': 100} for i in range(players)])
+        for first in range(0, hands, 10_000):
+            batch = range(first, min(first + 10_000, hands))
+            hand_rows, player_rows = [], []
+            for hand in batch:
+                cards = rng.sample(range(52), 4 * players + 3)
+                hand_rows.append({'id': hand + 1, 'game_id': 1, 'hand_number': 1,
+                                  'start_time': start + timedelta(seconds=hand),
+                                  'community_cards': cards_to_string(cards[:players]),
+                                  'dealer_cards': cards_to_string(cards[-3:]),
+                                  'deck_seed': rng.getrandbits(63), 'hand_key': f'{hand:032x}'})
+                for seat in range(players):
+                    mine = cards[players + seat * 3:players + seat * 3 + 3]
+                    player_rows.append({'hand_id': hand + 1, 'player_id': seat + 1,
+                                        'initial_cards': cards_to_string(mine),
+                                        'killed_card': cards_to_string(mine[:1]),
+                                        'kicked_card': cards_to_string(cards[seat:seat + 1]),
+                                        'turn_card': cards_to_string(cards[-1:]),
+                                        'final_hand': cards_to_string(mine[1:] + cards[:players]),
+                                        'bet_amount': 3, 'is_winner': seat == 0})
+            db.session.execute(insert(Hand), hand_rows)
+            db.session.execute(insert(HandPlayer), player_rows)
+        db.session.commit()
+
+def load_all():
+    """The old way: every row of every table through the ORM at once."""
+    import export_history
+    from src.models.models import GamePlayer, Hand, HandPlayer
+    app = export_history.create_app()
+    with app.app_context():
+        rows = sum(len(model.query.all()) for model in (Hand, HandPlayer, GamePlayer))
+    print(f'{rows} rows')
+
+def peak(args):
+    """Child process: run a script and print its peak memory in KiB as the last line."""
+    sys.argv = args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args[0])))
+    runpy.run_path(args[0], run_name='__main__')
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def run(*args):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, __file__, '--peak', *args],
+                            check=True, capture_output=True, text=True).stdout
+    return time.perf_counter() - started, int(output.splitlines()[-1]) / 1024
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hands', type=int, nargs='+', default=[20_000, 100_000])
+    parser.add_argument('--players', type=int, default=3)
+    parser.add_argument('--fill', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--load-all', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    parser.add_argument('--peak', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.peak:
+        return peak(args.peak)
+    if args.dir:
+        setup_env(args.dir)
+        if args.fill is not None:
+            return fill(args.fill, args.players)
+        return load_all()
+
+    for hands in args.hands:
+        directory = tempfile.mkdtemp()
+        subprocess.run([sys.executable, __file__, '--dir', directory, '--fill', str(hands),
+                        '--players', str(args.players)], check=True)
+        rows = hands * (args.players + 1) + args.players
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'export.db')
+        export = [os.path.join(SRC, 'export_history.py'), '--out', os.path.join(directory, 'out'), '--settle', '0']
+
+        print(f'{hands} hands, {rows} rows')
+        elapsed, peak_mib = run(*export, '--format', 'csv')
+        print(f'  export (csv):     {rows / elapsed:9.0f} rows/s, peak {peak_mib:6.0f} MiB')
+        try:
+            import pyarrow  # noqa: F401
+            elapsed, peak_mib = run(*export, '--format', 'parquet', '--full')
+            print(f'  export (parquet): {rows / elapsed:9.0f} rows/s, peak {peak_mib:6.0f} MiB')
+        except ImportError:
+            print('  export (parquet): skipped, pyarrow is not installed')
+        elapsed, peak_mib = run(__file__, '--dir', directory, '--load-all')
+        print(f'  ORM .all():       {rows / elapsed:9.0f} rows/s, peak {peak_mib:6.0f} MiB')
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,119 @@
+"""Measure journaling overhead and how fast a journal replays.
+
+Usage:
+    python3 benchmarks/replay_journal.py [--hands 200] [--players 3]
+
+Plays full hands headlessly (as headless_hands.py does) with the action
+journal on, then replays the table from the journal in a fresh process
+through src/replay.py, reports records replayed per second and checks
+that the rebuilt table matches the one the server ended with.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-hand values the replay does not reproduce: the random hand-history key and the countdowns
+VOLATILE = ('current_hand', 'timer', 'timer_deadline')
+
+def comparable(game_state):
+    from card_utils import serialize_game_state
+    state = json.loads(json.dumps(serialize_game_state(game_state), default=str))
+    for key in VOLATILE:
+        state.pop(key, None)
+    return state
+
+def play(args, directory):
+    os.environ.setdefault('SECRET_KEY', 'replay-journal')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['TIMER_CLOCK'] = 'simulated'
+    os.environ['TIMER_BACKGROUND'] = 'false'
+    os.environ['SNAPSHOTS'] = 'false'
+    os.environ['SQL_STATS_LOG_INTERVAL'] = '0'
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'replay-journal.db')
+    os.environ['JOURNAL_PATH'] = os.path.join(directory, 'journal.bin')
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+    import main
+    from scheduler import scheduler
+    from journal import journal
+
+    app, socketio = main.app, main.socketio
+    http = app.test_client()
+    seats = []
+    for i in range(args.players):
+        player = http.post('/api/player', json={'username': f'bot{i}', 'session_id': f'bot{i}-{time.time()}'}).json
+        client = socketio.test_client(app, flask_test_client=http)
+        joined = client.emit('join_table', {'session_id': player['session_id']}, callback=True)
+        seats.append((player, client))
+    table_id = joined['table_id']
+    game_state = main.game_states[table_id]
+
+    hands = 0
+    start = time.perf_counter()
+    while hands < args.hands:
+        if game_state['state'] == 'ante':
+            for player, client in seats:
+                seat = next(p for p in game_state['players'] if p['id'] == player['id'])
+                if 'last_action' not in seat:
+                    client.emit('player_action', {
+                        'session_id': player['session_id'], 'table_id': table_id,
+                        'action_type': 'bet', 'action_data': {'amount': 1}
+                    })
+            if game_state['state'] == 'ante':
+                break
+        elif not scheduler.run_until_idle(max_callbacks=1):
+            break
+        for player, client in seats[:1]:
+            hands += sum(1 for event in client.get_received() if event['name'] == 'hand_result')
+        for player, client in seats[1:]:
+            client.get_received()
+    elapsed = time.perf_counter() - start
+    journal.flush()
+
+    stats = journal.stats()
+    print(f'played {hands} hands in {elapsed:.2f}s ({hands / elapsed:.1f} hands/s) with the journal on')
+    print(f"journal: {stats['records']} records, {stats['bytes'] / 1024:.0f} KiB "
+          f"({stats['bytes'] / max(stats['records'], 1):.0f} bytes per record)")
+    with open(os.path.join(directory, 'expected.json'), 'w') as f:
+        json.dump({'table_id': table_id, 'state': comparable(game_state)}, f)
+
+def replay(directory):
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+    import replay
+    from journal import read_journal
+    with open(os.path.join(directory, 'expected.json')) as f:
+        expected = json.load(f)
+
+    started = time.perf_counter()
+    records = list(read_journal(os.path.join(directory, 'journal.bin')))
+    read = time.perf_counter() - started
+    started = time.perf_counter()
+    game_state = replay.replay_table(records, expected['table_id'])
+    replayed = time.perf_counter() - started
+
+    print(f'replay: read {len(records)} records in {read * 1000:.1f} ms, applied them in {replayed:.2f}s '
+          f'({len(records) / replayed:.0f} records/s)')
+    print('replayed table matches:', game_state is not None and comparable(game_state) == expected['state'])
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hands', type=int, default=200)
+    parser.add_argument('--players', type=int, default=3)
+    parser.add_argument('--replay', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.replay:
+        return replay(args.replay)
+    directory = tempfile.mkdtemp()
+    play(args, directory)
+    subprocess.run([sys.executable, __file__, '--replay', directory], check=True)
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,111 @@
+"""Measure table snapshot cost and how long a restart takes to restore every table.
+
+Usage:
+    python3 benchmarks/snapshot_restore.py [--tables 5000] [--players 5]
+
+Builds that many mid-hand tables (dealt cards, armed countdowns), snapshots
+them all the way the server does (capture on flush, then one background
+write), and then starts a fresh server process on the same files,
+reporting how long the restore took and the process's whole startup time.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def setup_env(directory):
+    os.environ.setdefault('SECRET_KEY', 'snapshot-restore')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['TIMER_BACKGROUND'] = 'false'
+    os.environ['SQL_STATS_LOG_INTERVAL'] = '0'
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'snapshot-restore.db')
+    os.environ.pop('DATABASE_INSTANCE', None)
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+def restart():
+    """Child process: start the server code, which restores the snapshot."""
+    started = time.perf_counter()
+    import main
+    from snapshot import snapshot_stats
+    from timer import table_timers
+    stats = snapshot_stats()
+    print(f"restored {stats['restored']} tables and {len(table_timers)} countdowns in "
+          f"{stats['restore_seconds']:.3f}s; startup took {time.perf_counter() - started:.3f}s "
+          f"({len(main.game_states)} tables live)")
+
+def build_tables(count, players):
+    import main
+    from card_utils import Deck, table_seed
+    from timer import start_timer
+    for table_id in range(1, count + 1):
+        deck = Deck(table_seed(table_id))
+        deck.shuffle()
+        main.game_states[table_id] = {
+            'game_id': table_id,
+            'players': [{
+                'id': table_id * 10 + seat,
+                'username': f'Player {table_id * 10 + seat}',
+                'chips': 250,
+                'seat': seat,
+                'status': 'active',
+                'cards': deck.deal(3),
+                'decisions': {'kill': None, 'kick': None},
+                'current_bet': 0,
+                'total_bet': 2,
+                'last_action': 'bet',
+            } for seat in range(players)],
+            'state': 'choose_trash',
+            'deck': deck,
+            'deck_seed': deck.seed,
+            'pot': 2 * players,
+            'current_hand': uuid.uuid4().hex,
+            'current_bet': 0,
+            'current_player_index': 0,
+            'community_cards': [],
+            'timer': 30,
+            'chat_enabled': True,
+        }
+        start_timer('choose_trash', table_id)
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=5000)
+    parser.add_argument('--players', type=int, default=5)
+    parser.add_argument('--restart', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp()
+    setup_env(directory)
+    if args.restart:
+        return restart()
+
+    import main
+    from snapshot import capture, write_pending, snapshot_stats
+    build_tables(args.tables, args.players)
+
+    started = time.perf_counter()
+    for table_id, game_state in main.game_states.items():
+        capture(table_id, game_state)
+    captured = time.perf_counter() - started
+
+    started = time.perf_counter()
+    write_pending()
+    written = time.perf_counter() - started
+
+    stats = snapshot_stats()
+    print(f'{args.tables} tables x {args.players} players')
+    print(f'capture: {captured / args.tables * 1e6:.1f} us per table (on the game thread)')
+    print(f"write:   {written:.3f}s for all tables, {stats['file_bytes'] / 1024:.0f} KiB "
+          f"({stats['file_bytes'] / args.tables:.0f} bytes per table)")
+
+    subprocess.run([sys.executable, __file__, '--restart', '--dir', directory], check=True)
+
+if __name__ == '__main__':
+    main_()
@@ -0,0 +1,215 @@
+import functools
+import threading
+from main import app, socketio
+from card_utils import serialize_game_state
+from scheduler import scheduler
+
+# Player fields only their owner may see; everyone else gets counts
+PRIVATE_PLAYER_FIELDS = ('cards', 'turn_card', 'killed_card', 'kicked_card', 'decisions', 'final_hand', 'hand_strength')
+
+# Table ID -> {'version': int, 'snapshot': last public view}
+table_versions = {}
+
+# Table ID -> {player ID: sid}, so private overlays reach only their owner
+table_seats = {}
+
+# Table ID -> {player ID: last private overlay sent}
+private_overlays = {}
+
+# Table ID -> game state waiting to be broadcast at the end of the event
+dirty_tables = {}
+_dirty_lock = threading.Lock()
+
+# Keeps versions in order when events and timers flush at the same time
+_send_lock = threading.RLock()
+
+# Called with (table ID, game state) for every table flushed
+_flush_hooks = []
+
+# Broadcasts asked for, broadcasts left after coalescing, and state events actually emitted
+emit_stats = {'requested': 0, 'flushed': 0, 'sent': 0}
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+def diff_states(old, new, path=''):
+    """JSON-patch style operations (add/remove/replace) turning old into new.
+
+    Lists are diffed item by item when their length is unchanged and
+    replaced whole otherwise.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        for key, value in new.items():
+            key_path = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': key_path, 'value': value})
+            else:
+                ops.extend(diff_states(old[key], value, key_path))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for i, (old_item, new_item) in enumerate(zip(old, new)):
+            ops.extend(diff_states(old_item, new_item, f'{path}/{i}'))
+        return ops
+
+    if type(old) is not type(new) or old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
+
+def _copy(value):
+    """Copy the lists and dicts in a JSON-like value, so later game_state mutations can't reach it."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy(item) for item in value]
+    return value
+
+def split_views(state):
+    """Split a serialized state into the public view and each player's private overlay.
+
+    The public view drops the deck and replaces every player's hidden
+    fields with card_count, has_turn_card and has_kicked; kicked cards
+    only become public as community_cards at board_reveal. Both are
+    copies that share nothing with the game state.
+    """
+    public = {key: _copy(value) for key, value in state.items() if key not in ('deck', 'players')}
+    public['players'] = []
+    overlays = {}
+    for player in state.get('players', []):
+        overlay = {field: _copy(player.get(field)) for field in PRIVATE_PLAYER_FIELDS}
+        overlays[player['id']] = overlay
+
+        player = {key: _copy(value) for key, value in player.items() if key not in PRIVATE_PLAYER_FIELDS}
+        player['card_count'] = len(overlay['cards'] or [])
+        player['has_turn_card'] = overlay['turn_card'] is not None
+        player['has_kicked'] = overlay['kicked_card'] is not None
+        public['players'].append(player)
+    return public, overlays
+
+def register_seat(table_id, player_id, sid):
+    table_seats.setdefault(int(table_id), {})[player_id] = sid
+
+def unregister_sid(sid):
+    """Forget every seat held by a disconnected client."""
+    for table_id, seats in table_seats.items():
+        for player_id in [p for p, seat_sid in seats.items() if seat_sid == sid]:
+            del seats[player_id]
+            private_overlays.get(table_id, {}).pop(player_id, None)
+
+def _send_overlays(table_id, overlays, version, force_player_id=None):
+    """Send each seated player their overlay if it changed since the last one."""
+    sent = private_overlays.setdefault(table_id, {})
+    for player_id, sid in table_seats.get(table_id, {}).items():
+        overlay = overlays.get(player_id)
+        if overlay is None:
+            continue
+        if sent.get(player_id) == overlay and player_id != force_player_id:
+            continue
+        sent[player_id] = overlay
+        socketio.emit('private_state', dict(overlay, player_id=player_id, state_version=version), to=sid)
+
+def broadcast_game_state(table_id, game_state):
+    """Mark the table for one broadcast at the end of the current event or timer batch."""
+    with _dirty_lock:
+        emit_stats['requested'] += 1
+        dirty_tables[int(table_id)] = game_state
+
+def flush_broadcasts(table_id=None):
+    """Broadcast every dirty table (or just table_id) once; return how many went out."""
+    with _dirty_lock:
+        if table_id is None:
+            pending = list(dirty_tables.items())
+            dirty_tables.clear()
+        elif int(table_id) in dirty_tables:
+            pending = [(int(table_id), dirty_tables.pop(int(table_id)))]
+        else:
+            pending = []
+    for dirty_table_id, game_state in pending:
+        _send_game_state(dirty_table_id, game_state)
+        for hook in _flush_hooks:
+            hook(dirty_table_id, game_state)
+    return len(pending)
+
+def add_flush_hook(hook):
+    """Also pass every table flushed to hook(table_id, game_state), e.g. to snapshot it."""
+    _flush_hooks.append(hook)
+
+def flush_after(handler):
+    """Flush the broadcasts a socket event handler queued once it returns."""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            flush_broadcasts()
+    return wrapper
+
+@app.after_request
+def flush_after_request(response):
+    flush_broadcasts()
+    return response
+
+scheduler.add_batch_hook(flush_broadcasts)
+
+def _send_game_state(table_id, game_state):
+    """Send the table what changed since the last broadcast, as a versioned delta.
+
+    The public view is built once per flush, without the deck, and kept
+    as the version's snapshot for the next diff and for send_snapshot().
+    Only the small private overlays are built per seat.
+    """
+    snapshot, overlays = split_views(serialize_game_state(game_state, include_deck=False) or {})
+
+    with _send_lock:
+        emit_stats['flushed'] += 1
+        last = table_versions.get(table_id)
+        if last is not None and last['snapshot'] == snapshot:
+            _send_overlays(table_id, overlays, last['version'])
+            return
+
+        emit_stats['sent'] += 1
+        if last is None:
+            version = 1
+            socketio.emit('game_state_update', dict(snapshot, state_version=version), room=f'table_{table_id}')
+        else:
+            version = last['version'] + 1
+            socketio.emit('game_state_delta', {
+                'version': version,
+                'base_version': last['version'],
+                'ops': diff_states(last['snapshot'], snapshot)
+            }, room=f'table_{table_id}')
+
+        table_versions[table_id] = {'version': version, 'snapshot': snapshot}
+        _send_overlays(table_id, overlays, version)
+
+def send_snapshot(table_id, game_state, to):
+    """Send one client the full public state at the current version and its own overlay."""
+    table_id = int(table_id)
+    flush_broadcasts(table_id)
+    with _send_lock:
+        if table_id not in table_versions:
+            _send_game_state(table_id, game_state)
+        last = table_versions[table_id]
+        socketio.emit('game_state_update', dict(last['snapshot'], state_version=last['version']), to=to)
+
+        player_id = next((p for p, sid in table_seats.get(table_id, {}).items() if sid == to), None)
+        if player_id is not None:
+            _, overlays = split_views(serialize_game_state(game_state, include_deck=False) or {})
+            _send_overlays(table_id, overlays, last['version'], force_player_id=player_id)
+
+def forget_table(table_id):
+    table_id = int(table_id)
+    with _dirty_lock:
+        dirty_tables.pop(table_id, None)
+    table_versions.pop(table_id, None)
+    table_seats.pop(table_id, None)
+    private_overlays.pop(table_id, None)
+
+def broadcast_stats():
+    with _dirty_lock:
+        return dict(emit_stats, pending=len(dirty_tables))
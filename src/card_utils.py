@@ -1,11 +1,30 @@
+import os
 import random
 
 SUITS = ['hearts', 'diamonds', 'clubs', 'spades']
 RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
 
+# Cards are ints 0-51: suit index * 13 + rank index.
+# They are converted to {'rank', 'suit'} dicts or '10_of_hearts' strings
+# only at the socket and DB edges.
+CARD_STRINGS = [f"{rank}_of_{suit}" for suit in SUITS for rank in RANKS]
+STRING_TO_CARD = {card_str: card for card, card_str in enumerate(CARD_STRINGS)}
+
+def make_card(rank, suit):
+    """Build a card from its rank and suit names."""
+    return SUITS.index(suit) * 13 + RANKS.index(rank)
+
+def card_rank(card):
+    """Return the rank name of a card."""
+    return RANKS[card % 13]
+
+def card_suit(card):
+    """Return the suit name of a card."""
+    return SUITS[card // 13]
+
 def create_deck():
     """Create a standard deck of 52 cards."""
-    return [{'rank': rank, 'suit': suit} for suit in SUITS for rank in RANKS]
+    return list(range(52))
 
 def shuffle_deck(deck):
     """Shuffle the deck."""
@@ -14,23 +33,192 @@ def shuffle_deck(deck):
 
 def deal_cards(deck, num_cards):
     """Deal a specified number of cards from the deck."""
+    if isinstance(deck, Deck):
+        return deck.deal(num_cards)
     return [deck.pop() for _ in range(num_cards)]
 
+def table_seed(table_id):
+    """Seed for a table's shuffle stream; derived from DECK_SEED when it is set."""
+    base_seed = os.getenv('DECK_SEED')
+    if base_seed is None:
+        return random.SystemRandom().getrandbits(63)
+    return random.Random(f'{base_seed}:{table_id}').getrandbits(63)
+
+def replay_deck(seed):
+    """Card order of a hand shuffled with the given seed."""
+    cards = list(range(52))
+    random.Random(seed).shuffle(cards)
+    return cards
+
+class Deck:
+    """A table's deck: allocated once, reshuffled in place and dealt with a cursor.
+
+    Every shuffle takes its seed from the table's seed stream and keeps it
+    in self.seed, so replay_deck(seed) reproduces that hand's card order.
+    """
+
+    def __init__(self, table_seed=None):
+        self.cards = list(range(52))
+        self.cursor = 0
+        self.seed = None
+        self.table_seed = table_seed
+        # Seeds taken from the stream so far
+        self.draws = 0
+        # Created on the first shuffle, so restoring a snapshot seeds no generators
+        self._seed_stream = None
+        self._shuffler = None
+
+    def _next_seed(self):
+        if self._seed_stream is None:
+            self._seed_stream = random.Random(self.table_seed)
+            for _ in range(self.draws):
+                self._seed_stream.getrandbits(63)
+        self.draws += 1
+        return self._seed_stream.getrandbits(63)
+
+    def shuffle(self, seed=None):
+        """Reshuffle all 52 cards in place and return the seed used."""
+        if seed is None:
+            seed = self._next_seed()
+        self.seed = seed
+        # Start from the canonical order so the result depends only on the seed
+        self.cards.sort()
+        if self._shuffler is None:
+            self._shuffler = random.Random()
+        self._shuffler.seed(seed)
+        self._shuffler.shuffle(self.cards)
+        self.cursor = 0
+        return seed
+
+    def deal(self, num_cards):
+        """Deal the next num_cards cards."""
+        end = self.cursor + num_cards
+        if end > len(self.cards):
+            raise ValueError('Not enough cards left in the deck')
+        cards = self.cards[self.cursor:end]
+        self.cursor = end
+        return cards
+
+    def remaining(self):
+        """Cards not dealt yet."""
+        return self.cards[self.cursor:]
+
+    def set_remaining(self, cards):
+        """Make the given cards the undealt part of the deck, in order."""
+        undealt = set(cards)
+        self.cards[:] = [card for card in range(52) if card not in undealt] + list(cards)
+        self.cursor = 52 - len(cards)
+        # The order no longer follows from a seed
+        self.seed = None
+
+    def snapshot(self):
+        """Compact state: the card order and cursor, the hand's seed and the seed stream position."""
+        return {'table_seed': self.table_seed, 'draws': self.draws, 'seed': self.seed,
+                'cursor': self.cursor, 'cards': self.cards}
+
+    def __reduce__(self):
+        # Pickle the compact state rather than both generators
+        return (Deck.restore, (self.snapshot(),))
+
+    @classmethod
+    def restore(cls, state):
+        """Rebuild a deck from snapshot(), with the same cards left and the same seeds to come."""
+        deck = cls(state['table_seed'])
+        deck.draws = state['draws']
+        deck.seed = state['seed']
+        deck.cards[:] = state['cards']
+        deck.cursor = state['cursor']
+        return deck
+
+    def __len__(self):
+        return len(self.cards) - self.cursor
+
 def card_to_string(card):
-    """Convert card object to string representation."""
-    return f"{card['rank']}_of_{card['suit']}"
+    """Convert card to string representation."""
+    return CARD_STRINGS[card]
 
 def string_to_card(card_str):
-    """Convert string representation to card object."""
-    rank, suit = card_str.split('_of_')
-    return {'rank': rank, 'suit': suit}
+    """Convert string representation to card."""
+    return STRING_TO_CARD[card_str]
 
 def cards_to_string(cards):
-    """Convert list of card objects to comma-separated string."""
-    return ','.join([card_to_string(card) for card in cards])
+    """Convert list of cards to comma-separated string."""
+    return ','.join([CARD_STRINGS[card] for card in cards])
 
 def string_to_cards(cards_str):
-    """Convert comma-separated string to list of card objects."""
+    """Convert comma-separated string to list of cards."""
     if not cards_str:
         return []
-    return [string_to_card(card_str) for card_str in cards_str.split(',')]
+    return [STRING_TO_CARD[card_str] for card_str in cards_str.split(',')]
+
+def card_to_dict(card, is_tango=False):
+    """Convert card to the {'rank', 'suit'} object sent to clients."""
+    card_dict = {'rank': RANKS[card % 13], 'suit': SUITS[card // 13]}
+    if is_tango:
+        card_dict['is_tango'] = True
+    return card_dict
+
+def dict_to_card(card_dict):
+    """Convert a client {'rank', 'suit'} object back to a card."""
+    return make_card(card_dict['rank'], card_dict['suit'])
+
+def serialize_game_state(game_state, include_deck=True):
+    """Return a copy of the game state with cards converted for clients.
+
+    include_deck=False leaves the remaining deck out, for views that never show it.
+    """
+    if not game_state:
+        return game_state
+
+    players = game_state.get('players', [])
+    kicked_cards = {p['kicked_card'] for p in players if p.get('kicked_card') is not None}
+
+    state = dict(game_state)
+    # The seed would reveal the whole card order
+    state.pop('deck_seed', None)
+    if not include_deck:
+        state.pop('deck', None)
+    elif 'deck' in state:
+        state['deck'] = [card_to_dict(card) for card in state['deck'].remaining()]
+    if 'community_cards' in state:
+        state['community_cards'] = [card_to_dict(card, card in kicked_cards) for card in state['community_cards']]
+
+    state['players'] = []
+    for player in players:
+        player = dict(player)
+        if player.get('cards') is not None:
+            player['cards'] = [card_to_dict(card, card in kicked_cards) for card in player['cards']]
+        if player.get('turn_card') is not None:
+            player['turn_card'] = card_to_dict(player['turn_card'])
+        if player.get('killed_card') is not None:
+            player['killed_card'] = card_to_dict(player['killed_card'])
+        if player.get('kicked_card') is not None:
+            player['kicked_card'] = card_to_dict(player['kicked_card'], True)
+        if player.get('final_hand') is not None:
+            player['final_hand'] = [card_to_dict(card, card in kicked_cards) for card in player['final_hand']]
+        state['players'].append(player)
+
+    return state
+
+def deserialize_game_state(state):
+    """Convert client card objects in a game state back to cards."""
+    game_state = dict(state)
+    if game_state.get('community_cards') is not None:
+        game_state['community_cards'] = [dict_to_card(card) for card in game_state['community_cards']]
+    if game_state.get('deck') is not None:
+        deck = Deck()
+        deck.set_remaining([dict_to_card(card) for card in game_state['deck']])
+        game_state['deck'] = deck
+
+    game_state['players'] = []
+    for player in state.get('players', []):
+        player = dict(player)
+        for key in ['cards', 'final_hand']:
+            if player.get(key) is not None:
+                player[key] = [dict_to_card(card) for card in player[key]]
+        for key in ['turn_card', 'killed_card', 'kicked_card']:
+            if player.get(key) is not None:
+                player[key] = dict_to_card(player[key])
+        game_state['players'].append(player)
+
+    return game_state
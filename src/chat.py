@@ -0,0 +1,47 @@
+import os
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert
+from src.models.models import ChatMessage
+from src.models import db
+from write_behind import BatchWriter
+
+# Recent messages kept per table for players who join later
+CHAT_HISTORY_SIZE = int(os.getenv('CHAT_HISTORY_SIZE', 50))
+
+# Table ID -> deque of the latest chat messages, as broadcast
+chat_histories = {}
+
+def _write_chat_batch(rows):
+    db.session.execute(insert(ChatMessage), rows)
+    db.session.commit()
+
+chat_writer = BatchWriter(
+    'chat',
+    _write_chat_batch,
+    max_batch=int(os.getenv('CHAT_BATCH_SIZE', 100)),
+    max_delay=float(os.getenv('CHAT_BATCH_DELAY', 1.0))
+)
+
+def post_chat_message(table_id, game_id, player, message):
+    """Record a chat message in the table's history and queue it for the DB; return it for broadcasting."""
+    now = datetime.utcnow()
+    chat_message = {
+        'player_id': player.id,
+        'username': player.username or f'Player {player.id}',
+        'message': message,
+        'timestamp': now.isoformat()
+    }
+    history = chat_histories.get(int(table_id))
+    if history is None:
+        history = chat_histories[int(table_id)] = deque(maxlen=CHAT_HISTORY_SIZE)
+    history.append(chat_message)
+
+    chat_writer.submit({'game_id': game_id, 'player_id': player.id, 'message': message, 'timestamp': now})
+    return chat_message
+
+def chat_history(table_id):
+    return list(chat_histories.get(int(table_id), ()))
+
+def forget_chat(table_id):
+    chat_histories.pop(int(table_id), None)
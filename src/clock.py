@@ -0,0 +1,65 @@
+import os
+import time
+from main import socketio
+
+class RealClock:
+    """Real time, optionally running `speed` times faster.
+
+    Deadlines are kept on monotonic(), which an NTP step or a manual clock
+    change cannot move; time() is epoch seconds, for what clients see.
+    """
+
+    simulated = False
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self._start_time = time.time()
+        self._start_monotonic = time.monotonic()
+
+    def monotonic(self):
+        """Seconds on a clock that never jumps, for scheduling."""
+        return self._start_monotonic + (time.monotonic() - self._start_monotonic) * self.speed
+
+    def time(self):
+        """Current time in epoch seconds."""
+        if self.speed == 1.0:
+            return time.time()
+        return self._start_time + (time.monotonic() - self._start_monotonic) * self.speed
+
+    def sleep(self, seconds):
+        socketio.sleep(seconds / self.speed)
+
+    def advance_to(self, deadline):
+        """Real time cannot be skipped: wait until the monotonic() deadline."""
+        self.sleep(max(deadline - self.monotonic(), 0))
+
+class SimulatedClock:
+    """Virtual time that only moves when advanced, so countdowns cost no waiting."""
+
+    simulated = True
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+
+    def time(self):
+        return self._now
+
+    # Simulated time only moves forward, so it serves as both clocks
+    monotonic = time
+
+    def advance(self, seconds):
+        self._now += max(seconds, 0)
+
+    def advance_to(self, timestamp):
+        self._now = max(self._now, timestamp)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+        # Still let other green threads run
+        socketio.sleep(0)
+
+def clock_from_env():
+    """Build the clock selected by TIMER_CLOCK ('real' or 'simulated') and TIMER_SPEED."""
+    if os.getenv('TIMER_CLOCK', 'real').lower() == 'simulated':
+        return SimulatedClock()
+    return RealClock(float(os.getenv('TIMER_SPEED', 1.0)))
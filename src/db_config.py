@@ -0,0 +1,76 @@
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+# PRAGMAs run on every new SQLite connection; the defaults suit several
+# tables (and workers) writing small transactions to one file
+SQLITE_PRAGMAS = {
+    # Readers no longer block the writer, and a commit appends to the log instead of rewriting pages
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    # In WAL mode NORMAL only syncs at checkpoints; a power cut may lose the last commits but never corrupts
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # Milliseconds a writer waits for the lock before failing with "database is locked"
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative sizes are in KiB
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+def database_uri():
+    """The database to use, the same one on every start.
+
+    DATABASE_URL may name the database in full (e.g. sqlite:///tango.db or
+    a server URL); a bare SQLite path gets a .db suffix. Setting
+    DATABASE_INSTANCE keeps a separate file per instance, e.g. for
+    benchmarks and throwaway runs.
+    """
+    url = os.getenv('DATABASE_URL', 'sqlite:///tango')
+    instance = os.getenv('DATABASE_INSTANCE')
+    if not url.startswith('sqlite:'):
+        return url
+    if instance:
+        return f'{url}_{instance}.db'
+    return url if url.endswith('.db') or url.endswith(':memory:') or url == 'sqlite://' else url + '.db'
+
+def data_path(app, name):
+    """Path of a file the server keeps beside its SQLite database (else in the instance folder)."""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        base = os.path.join(app.instance_path, url.database)
+    else:
+        base = os.path.join(app.instance_path, 'tango')
+    return f'{base}.{name}'
+
+def engine_options(uri):
+    """Connection pool settings (socket handlers, timers and background writers each hold a connection)."""
+    if uri.startswith('sqlite:') and (uri == 'sqlite://' or uri.endswith(':memory:')):
+        # In-memory databases live in a single connection
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true',
+    }
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma}={value}')
+    finally:
+        cursor.close()
+
+def database_stats(engine):
+    """Pool usage, and the PRAGMAs as SQLite reports them to check they took effect."""
+    stats = {'url': engine.url.render_as_string(hide_password=True), 'pool': engine.pool.status()}
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            stats['pragmas'] = {pragma: connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()
+                                for pragma in SQLITE_PRAGMAS}
+    return stats
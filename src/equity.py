@@ -0,0 +1,179 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import comb
+
+from evaluator import add_cards, evaluate_masks
+
+# Choices whose deal count is at or below this are enumerated exactly,
+# everything else is sampled.
+EXACT_LIMIT = int(os.getenv('EQUITY_EXACT_LIMIT', 200_000))
+DEFAULT_SAMPLES = int(os.getenv('EQUITY_SAMPLES', 5_000))
+# Most samples a client may ask for; every request shares the one pool
+MAX_SAMPLES = int(os.getenv('EQUITY_MAX_SAMPLES', 50_000))
+
+_executor = None
+
+def get_executor():
+    """Return the shared process pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv('EQUITY_WORKERS', os.cpu_count() or 1))
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def parse_samples(value):
+    """Validate a client's sample count: None for the default, else an int from 1 to MAX_SAMPLES."""
+    if value is None:
+        return None
+    try:
+        samples = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'samples must be a whole number, got {value!r}')
+    if isinstance(value, bool) or not 1 <= samples <= MAX_SAMPLES:
+        raise ValueError(f'samples must be between 1 and {MAX_SAMPLES}')
+    return samples
+
+def classification_choices(cards):
+    """List the kill/kick choices available for a player's cards.
+
+    With 3 cards every (kill, kick) pair is possible; once a card has been
+    killed only the kick remains. Indexes match what
+    helpers.process_classification_action expects: the kick index points
+    into the cards left after the kill.
+    """
+    choices = []
+    if len(cards) == 3:
+        for kill in range(3):
+            remaining = [card for i, card in enumerate(cards) if i != kill]
+            for kick in range(2):
+                choices.append({'kill': kill, 'kick': kick, 'kicked_card': remaining[kick], 'kept_card': remaining[1 - kick]})
+    elif len(cards) == 2:
+        for kick in range(2):
+            choices.append({'kill': None, 'kick': kick, 'kicked_card': cards[kick], 'kept_card': cards[1 - kick]})
+    return choices
+
+def count_deals(num_unknown, board_needed, num_opponents, turn_known=False):
+    """Number of distinct deals of the unknown cards for one choice."""
+    deals = comb(num_unknown, board_needed)
+    remaining = num_unknown - board_needed
+    if not turn_known:
+        deals *= remaining
+        remaining -= 1
+    for _ in range(num_opponents):
+        deals *= comb(remaining, 2)
+        remaining -= 2
+    return deals
+
+def _score_deal(kept_card, board_state, hero_turn, opponent_hands):
+    """Return 1 for a win, 0 for a tie and -1 for a loss."""
+    _, suit_masks, m1, m2, m3, m4 = add_cards((kept_card, hero_turn), *board_state)
+    hero = evaluate_masks(suit_masks, m1, m2, m3, m4)
+
+    best_opponent = 0
+    for hand in opponent_hands:
+        _, suit_masks, m1, m2, m3, m4 = add_cards(hand, *board_state)
+        best_opponent = max(best_opponent, evaluate_masks(suit_masks, m1, m2, m3, m4))
+
+    if hero > best_opponent:
+        return 1
+    if hero == best_opponent:
+        return 0
+    return -1
+
+def _opponent_deals(cards, num_opponents):
+    """Yield every ordered assignment of 2-card hands to the opponents."""
+    if num_opponents == 0:
+        yield []
+        return
+    for hand in combinations(cards, 2):
+        rest = [card for card in cards if card not in hand]
+        for others in _opponent_deals(rest, num_opponents - 1):
+            yield [hand] + others
+
+def choice_equity(kept_card, board, unknown, board_needed, num_opponents, samples, seed=None, turn_card=None):
+    """Win/tie probabilities for one choice.
+
+    board holds the known community cards (the player's own kicked card and
+    any kicked cards already revealed). board_needed cards are still to come
+    from unknown, plus the player's turn card (unless turn_card is already
+    dealt) and a kept card and turn card for each opponent.
+    """
+    results = {1: 0, 0: 0, -1: 0}
+    deals = count_deals(len(unknown), board_needed, num_opponents, turn_card is not None)
+
+    if deals <= EXACT_LIMIT:
+        for board_fill in combinations(unknown, board_needed):
+            board_state = add_cards(list(board) + list(board_fill))
+            after_board = [card for card in unknown if card not in board_fill]
+            for hero_turn in (after_board if turn_card is None else [turn_card]):
+                rest = [card for card in after_board if card != hero_turn]
+                for opponent_hands in _opponent_deals(rest, num_opponents):
+                    results[_score_deal(kept_card, board_state, hero_turn, opponent_hands)] += 1
+        method = 'exact'
+        total = deals
+    else:
+        rng = random.Random(seed)
+        hero_draws = 1 if turn_card is None else 0
+        needed = board_needed + hero_draws + 2 * num_opponents
+        for _ in range(samples):
+            drawn = rng.sample(unknown, needed)
+            board_state = add_cards(list(board) + drawn[:board_needed])
+            hero_turn = drawn[board_needed] if turn_card is None else turn_card
+            opponent_cards = drawn[board_needed + hero_draws:]
+            opponent_hands = [opponent_cards[i:i + 2] for i in range(0, len(opponent_cards), 2)]
+            results[_score_deal(kept_card, board_state, hero_turn, opponent_hands)] += 1
+        method = 'monte_carlo'
+        total = samples
+
+    return {
+        'win': results[1] / total if total else 0.0,
+        'tie': results[0] / total if total else 0.0,
+        'method': method,
+        'deals': total,
+    }
+
+def submit_equity(cards, kicked_cards=(), num_players=2, dead_cards=(), samples=None, seed=None, kicked_card=None,
+                  turn_card=None):
+    """Queue an equity calculation for every kill/kick choice on the process pool.
+
+    With kicked_card (a kick already made) only the choices kicking that
+    card are calculated; turn_card is the player's turn card once dealt.
+    Returns a list of (choice, future) pairs; each future resolves to the
+    choice_equity result for that choice.
+    """
+    if len(cards) not in (2, 3):
+        raise ValueError('Expected 2 or 3 player cards')
+    if num_players < 2:
+        raise ValueError('At least 2 players are required')
+
+    known = set(cards) | set(kicked_cards) | set(dead_cards) | ({turn_card} if turn_card is not None else set())
+    unknown = [card for card in range(52) if card not in known]
+
+    num_opponents = num_players - 1
+    # Community = one kicked card per player, topped up to 5 by the dealer
+    community_size = max(5, num_players)
+    board_needed = community_size - 1 - len(kicked_cards)
+    hero_draws = 1 if turn_card is None else 0
+    if board_needed < 0 or board_needed + hero_draws + 2 * num_opponents > len(unknown):
+        raise ValueError('Not enough unknown cards for this many players')
+
+    executor = get_executor()
+    jobs = []
+    for choice in classification_choices(list(cards)):
+        if kicked_card is not None and choice['kicked_card'] != kicked_card:
+            continue
+        board = list(kicked_cards) + [choice['kicked_card']]
+        future = executor.submit(
+            choice_equity, choice['kept_card'], board, unknown, board_needed,
+            num_opponents, samples or DEFAULT_SAMPLES, seed, turn_card
+        )
+        jobs.append((choice, future))
+    return jobs
@@ -0,0 +1,149 @@
+# Hand categories, same numbering as poker.get_best_hand
+HIGH_CARD = 1
+ONE_PAIR = 2
+TWO_PAIR = 3
+THREE_OF_A_KIND = 4
+STRAIGHT = 5
+FLUSH = 6
+FULL_HOUSE = 7
+FOUR_OF_A_KIND = 8
+STRAIGHT_FLUSH = 9
+ROYAL_FLUSH = 10
+
+CATEGORY_SHIFT = 20
+
+# Per-card lookups for int cards (see card_utils)
+CARD_RANK_BIT = [1 << (card % 13) for card in range(52)]
+CARD_SUIT = [card // 13 for card in range(52)]
+
+# Lookup tables indexed by a 13-bit rank mask (bit 0 = '2', bit 12 = 'A')
+POPCOUNT = []
+TOP_RANK = []       # value (2-14) of the highest rank in the mask, 0 if empty
+TOP_FIVE = []       # up to five highest rank values packed as nibbles, highest first
+STRAIGHT_HIGH = []  # value of the highest straight's top card, 5 for the wheel, 0 if none
+
+def _build_tables():
+    wheel = (1 << 12) | 0b1111
+    for mask in range(1 << 13):
+        values = [i + 2 for i in range(12, -1, -1) if mask & (1 << i)]
+        POPCOUNT.append(len(values))
+        TOP_RANK.append(values[0] if values else 0)
+
+        packed = 0
+        for i in range(5):
+            packed = (packed << 4) | (values[i] if i < len(values) else 0)
+        TOP_FIVE.append(packed)
+
+        high = 0
+        for top in range(12, 3, -1):
+            window = 0b11111 << (top - 4)
+            if mask & window == window:
+                high = top + 2
+                break
+        if not high and mask & wheel == wheel:
+            high = 5
+        STRAIGHT_HIGH.append(high)
+
+_build_tables()
+
+def _bit(value):
+    return 1 << (value - 2)
+
+def evaluate_masks(suit_masks, m1, m2, m3, m4):
+    """Score a hand from its per-suit rank masks and rank multiplicity masks.
+
+    mN has a bit set for every rank held at least N times.
+    """
+    flush = 0
+    for suit_mask in suit_masks:
+        if POPCOUNT[suit_mask] >= 5:
+            high = STRAIGHT_HIGH[suit_mask]
+            if high == 14:
+                return ROYAL_FLUSH << CATEGORY_SHIFT | high
+            if high:
+                return STRAIGHT_FLUSH << CATEGORY_SHIFT | high
+            flush = max(flush, TOP_FIVE[suit_mask])
+
+    if m4:
+        quad = TOP_RANK[m4]
+        kicker = TOP_RANK[m1 & ~_bit(quad)]
+        return FOUR_OF_A_KIND << CATEGORY_SHIFT | quad << 4 | kicker
+
+    if m3:
+        three = TOP_RANK[m3]
+        pair = TOP_RANK[m2 & ~_bit(three)]
+        if pair:
+            return FULL_HOUSE << CATEGORY_SHIFT | three << 4 | pair
+
+    if flush:
+        return FLUSH << CATEGORY_SHIFT | flush
+
+    high = STRAIGHT_HIGH[m1]
+    if high:
+        return STRAIGHT << CATEGORY_SHIFT | high
+
+    if m3:
+        kickers = TOP_FIVE[m1 & ~_bit(three)] >> 12
+        return THREE_OF_A_KIND << CATEGORY_SHIFT | three << 8 | kickers
+
+    if POPCOUNT[m2] >= 2:
+        high_pair = TOP_RANK[m2]
+        low_pair = TOP_RANK[m2 & ~_bit(high_pair)]
+        kicker = TOP_RANK[m1 & ~(_bit(high_pair) | _bit(low_pair))]
+        return TWO_PAIR << CATEGORY_SHIFT | high_pair << 8 | low_pair << 4 | kicker
+
+    if m2:
+        pair = TOP_RANK[m2]
+        kickers = TOP_FIVE[m1 & ~_bit(pair)] >> 8
+        return ONE_PAIR << CATEGORY_SHIFT | pair << 12 | kickers
+
+    return HIGH_CARD << CATEGORY_SHIFT | TOP_FIVE[m1]
+
+def add_cards(cards, seen=0, suit_masks=(0, 0, 0, 0), m1=0, m2=0, m3=0, m4=0):
+    """Fold cards into an evaluation state (seen, suit_masks, m1, m2, m3, m4)."""
+    suit_masks = list(suit_masks)
+    for card in cards:
+        card_bit = 1 << card
+        if seen & card_bit:
+            continue
+        seen |= card_bit
+
+        bit = CARD_RANK_BIT[card]
+        suit_masks[CARD_SUIT[card]] |= bit
+        if not m1 & bit:
+            m1 |= bit
+        elif not m2 & bit:
+            m2 |= bit
+        elif not m3 & bit:
+            m3 |= bit
+        else:
+            m4 |= bit
+
+    return seen, suit_masks, m1, m2, m3, m4
+
+def evaluate_hand(cards):
+    """Calculate hand strength from 5 or more poker cards.
+
+    Replacement for poker.calculate_hand_strength working on int cards
+    (see card_utils): returns a single integer where a higher value is a
+    better hand. Duplicate cards are counted once.
+    """
+    _, suit_masks, m1, m2, m3, m4 = add_cards(cards)
+    return evaluate_masks(suit_masks, m1, m2, m3, m4)
+
+def evaluate_hands(hands, board=()):
+    """Score several hands that share the same board in one call.
+
+    The board is folded into the evaluation state once and each hand only
+    adds its own cards on top of it.
+    """
+    board_state = add_cards(board)
+    strengths = []
+    for cards in hands:
+        _, suit_masks, m1, m2, m3, m4 = add_cards(cards, *board_state)
+        strengths.append(evaluate_masks(suit_masks, m1, m2, m3, m4))
+    return strengths
+
+def hand_category(strength):
+    """Return the hand category (HIGH_CARD .. ROYAL_FLUSH) of a strength value."""
+    return strength >> CATEGORY_SHIFT
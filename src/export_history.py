@@ -0,0 +1,287 @@
+"""Export hand history to gzipped CSV and Parquet files, incrementally.
+
+Usage:
+    python3 src/export_history.py [--out exports] [--format csv --format parquet] [--full]
+
+Streams the hands, hand_players and game_players tables in id order, in
+keyset-paginated pages read through a streaming cursor, so memory stays
+flat however much history there is. Each table goes to its own file per
+run, named after the id range it holds (hands-1-51234.csv.gz). The card
+columns, stored as cards_to_string() text, are written as card numbers
+0-51, with rank and suit alongside for the single-card columns.
+
+The highest id exported from each table is kept in export-state.json in
+the output directory, and the next run starts after it (--full starts
+over). Hands started less than --settle seconds ago are left for the next
+run, because their cards are still being written. Parquet needs pyarrow;
+without it only CSV is written.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from flask import Flask
+from sqlalchemy import func, select
+from src.models import db
+from src.models.models import Hand, HandPlayer, GamePlayer
+
+load_dotenv()
+
+from log_config import setup_logging, get_logger
+from db_config import database_uri, engine_options
+from card_utils import STRING_TO_CARD, RANKS, SUITS
+
+logger = get_logger('export')
+
+# Rows per keyset page (one short query each, so a long export never holds a read snapshot open)
+PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 50_000))
+# Rows fetched from the cursor, and written as one Parquet row group, at a time
+CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 5_000))
+STATE_FILE = 'export-state.json'
+
+# Output columns per table: 'card' columns become <name>, <name>_rank and <name>_suit,
+# 'cards' columns a list of card numbers (space-separated in CSV)
+SCHEMAS = {
+    'hands': (Hand, [
+        ('id', 'int'), ('game_id', 'int'), ('hand_number', 'int'), ('start_time', 'datetime'),
+        ('end_time', 'datetime'), ('deck_seed', 'int'), ('hand_key', 'str'),
+        ('community_cards', 'cards'), ('dealer_cards', 'cards'),
+    ]),
+    'hand_players': (HandPlayer, [
+        ('id', 'int'), ('hand_id', 'int'), ('player_id', 'int'), ('initial_cards', 'cards'),
+        ('kept_card', 'card'), ('killed_card', 'card'), ('kicked_card', 'card'), ('turn_card', 'card'),
+        ('final_hand', 'cards'), ('bet_amount', 'int'), ('is_winner', 'bool'),
+    ]),
+    'game_players': (GamePlayer, [
+        ('id', 'int'), ('game_id', 'int'), ('player_id', 'int'), ('seat_position', 'int'),
+        ('initial_chips', 'int'), ('final_chips', 'int'),
+    ]),
+}
+
+def output_columns(columns):
+    names = []
+    for name, kind in columns:
+        names.append(name)
+        if kind == 'card':
+            names += [f'{name}_rank', f'{name}_suit']
+    return names
+
+def decode_row(row, columns):
+    """One database row as output values, in output_columns() order."""
+    values = []
+    for name, kind in columns:
+        value = row[name]
+        if kind == 'card':
+            card = STRING_TO_CARD.get(value)
+            values += [card, None, None] if card is None else [card, RANKS[card % 13], SUITS[card // 13]]
+        elif kind == 'cards':
+            # Unknown card names are dropped rather than failing the export
+            values.append([STRING_TO_CARD[card] for card in value.split(',') if card in STRING_TO_CARD]
+                          if value else [])
+        else:
+            values.append(value)
+    return values
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ' '.join(map(str, value))
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.path = path
+        self._file = gzip.open(path, 'wt', newline='', compresslevel=6)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(output_columns(columns))
+
+    def write(self, rows):
+        self._writer.writerows([csv_value(value) for value in row] for row in rows)
+
+    def close(self, path):
+        self._file.close()
+        os.replace(self.path, path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.path)
+
+class ParquetWriter:
+    """One row group per chunk, against a schema fixed per table."""
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.path = path
+        types = {'int': pa.int64(), 'str': pa.string(), 'bool': pa.bool_(), 'datetime': pa.timestamp('us'),
+                 'cards': pa.list_(pa.int8())}
+        fields = []
+        for name, kind in columns:
+            if kind == 'card':
+                fields += [pa.field(name, pa.int8()), pa.field(f'{name}_rank', pa.string()),
+                           pa.field(f'{name}_suit', pa.string())]
+            else:
+                fields.append(pa.field(name, types[kind]))
+        self.schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self, path):
+        self._writer.close()
+        os.replace(self.path, path)
+
+    def discard(self):
+        self._writer.close()
+        os.remove(self.path)
+
+WRITERS = {'csv': ('csv.gz', CsvWriter), 'parquet': ('parquet', ParquetWriter)}
+
+def stream_rows(connection, model, columns, after_id, last_id):
+    """Yield chunks of rows with after_id < id <= last_id, in id order."""
+    table = model.__table__
+    query = select(*[table.c[name] for name, _ in columns]).order_by(table.c.id)
+    while after_id < last_id:
+        page = query.where(table.c.id > after_id, table.c.id <= last_id).limit(PAGE_SIZE)
+        result = connection.execution_options(stream_results=True, yield_per=CHUNK_SIZE).execute(page)
+        fetched = 0
+        for chunk in result.mappings().partitions():
+            fetched += len(chunk)
+            after_id = chunk[-1]['id']
+            yield [decode_row(row, columns) for row in chunk]
+        # End the read transaction so WAL checkpoints can go on between pages
+        connection.rollback()
+        if fetched < PAGE_SIZE:
+            break
+
+def _first_unsettled(connection, column, after_id, condition):
+    """Id just before the first row after after_id matching condition, else the table's highest id."""
+    first = connection.scalar(select(func.min(column)).where(column > after_id, condition))
+    return first - 1 if first is not None else connection.scalar(select(func.max(column))) or 0
+
+def export_cutoffs(connection, marks, settle):
+    """Highest id of each table that is safe to export now."""
+    cutoffs = {'game_players': connection.scalar(select(func.max(GamePlayer.id))) or 0}
+
+    # Hand rows are updated as the hand plays out, so stop at the first hand that may still be running
+    settled = datetime.utcnow() - timedelta(seconds=settle)
+    cutoffs['hands'] = _first_unsettled(connection, Hand.id, marks.get('hands', 0),
+                                        Hand.start_time >= settled)
+    cutoffs['hand_players'] = _first_unsettled(connection, HandPlayer.id, marks.get('hand_players', 0),
+                                               HandPlayer.hand_id > cutoffs['hands'])
+    connection.rollback()
+    return cutoffs
+
+def export_table(connection, name, out, formats, after_id, last_id):
+    """Write one table's new rows; return (rows, highest id written).
+
+    Files are written under a temporary name and only get their final
+    name, after the id range they hold, once complete.
+    """
+    model, columns = SCHEMAS[name]
+    writers = []
+    rows = 0
+    highest = after_id
+    try:
+        for chunk in stream_rows(connection, model, columns, after_id, last_id):
+            if not writers:
+                writers = [(suffix, writer(os.path.join(out, f'{name}.{suffix}.tmp'), columns))
+                           for suffix, writer in (WRITERS[fmt] for fmt in formats)]
+            for _, writer in writers:
+                writer.write(chunk)
+            rows += len(chunk)
+            highest = chunk[-1][0]
+    except BaseException:
+        for _, writer in writers:
+            writer.discard()
+        raise
+    for suffix, writer in writers:
+        writer.close(os.path.join(out, f'{name}-{after_id + 1}-{highest}.{suffix}'))
+    return rows, highest
+
+def load_marks(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_marks(path, marks):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(marks, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def create_app():
+    """A bare app on the server's database, without its sockets, timers and background tasks."""
+    app = Flask('main', root_path=os.path.dirname(os.path.abspath(__file__)))
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default='exports', help='output directory (default: exports)')
+    parser.add_argument('--format', action='append', choices=sorted(WRITERS), dest='formats',
+                        help='csv and/or parquet (default: both, or csv without pyarrow)')
+    parser.add_argument('--table', action='append', choices=sorted(SCHEMAS), dest='tables',
+                        help='tables to export (default: all)')
+    parser.add_argument('--full', action='store_true', help='ignore the high-water marks and export everything')
+    parser.add_argument('--settle', type=float, default=300,
+                        help='seconds after its start before a hand is exported (default: 300)')
+    args = parser.parse_args()
+    setup_logging()
+
+    formats = args.formats or ['csv', 'parquet']
+    if 'parquet' in formats:
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            if args.formats:
+                sys.exit('Parquet output needs pyarrow (pip install pyarrow)')
+            logger.warning('pyarrow is not installed, writing CSV only')
+            formats = ['csv']
+
+    os.makedirs(args.out, exist_ok=True)
+    state_path = os.path.join(args.out, STATE_FILE)
+    marks = {} if args.full else load_marks(state_path)
+
+    app = create_app()
+    with app.app_context(), db.engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Every page is read once, so the server's page cache and mmap would only grow the process
+            connection.exec_driver_sql('PRAGMA cache_size = -2000')
+            connection.exec_driver_sql('PRAGMA mmap_size = 0')
+        cutoffs = export_cutoffs(connection, marks, args.settle)
+        for name in args.tables or list(SCHEMAS):
+            after_id = marks.get(name, 0)
+            started = time.perf_counter()
+            rows, highest = export_table(connection, name, args.out, formats, after_id, cutoffs[name])
+            elapsed = time.perf_counter() - started
+            # The mark only moves once the table's files are complete
+            marks[name] = highest
+            save_marks(state_path, marks)
+            print(f'{name}: {rows} rows (ids {after_id + 1}-{highest}) in {elapsed:.2f}s'
+                  if rows else f'{name}: nothing new after id {after_id}')
+
+if __name__ == '__main__':
+    main()
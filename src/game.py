@@ -1,10 +1,14 @@
-from main import  app, timer_config, socketio
-from card_utils import deal_cards,  cards_to_string, card_to_string
-from src.models.models import Table, Game, GamePlayer, Hand, HandPlayer
-from src.models import db
+from main import timer_config, socketio
+from card_utils import deal_cards
+from broadcast import broadcast_game_state
+from hand_history import start_hand, record_board, record_player_card
+from log_config import get_logger, table_logger
+
+logger = get_logger('game')
 
 def moveGameStateToNext(game_state, table_id):
     from timer import start_timer
+    log = table_logger(logger, table_id)
     old_game_state = game_state['state']
     if game_state['state'] == 'waiting':
         game_state['state'] = 'ante'
@@ -19,29 +23,8 @@ def moveGameStateToNext(game_state, table_id):
             player['cards'] = deal_cards(game_state['deck'], 3)
             player['decisions'] = {'kill': None, 'kick': None}
 
-        # Create a new hand
-        with app.app_context():
-            game = Game.query.get(game_state['game_id'])
-            if game:
-                hand = Hand(
-                    game_id=game.id,
-                    hand_number=1  # First hand
-                )
-                db.session.add(hand)
-                db.session.commit()
-                
-                # Save initial cards for each player
-                for player in game_state['players']:
-                    hand_player = HandPlayer(
-                        hand_id=hand.id,
-                        player_id=player['id'],
-                        initial_cards=cards_to_string(player['cards'])
-                    )
-                    db.session.add(hand_player)
-                
-                db.session.commit()
-                
-                game_state['current_hand'] = hand.id
+        # Create a new hand; it is written to the DB in the background
+        start_hand(game_state)
 
         start_timer('card_draw', table_id)
     elif game_state['state'] == 'card_draw':
@@ -66,18 +49,7 @@ def moveGameStateToNext(game_state, table_id):
         active_players = get_active_players(game_state)
         for player in active_players:
             player['turn_card'] = deal_cards(game_state['deck'], 1)[0]
-
-            # Update DB
-            with app.app_context():
-                hand = Hand.query.get(game_state['current_hand'])
-                if hand:
-                    hand_player = HandPlayer.query.filter_by(
-                        hand_id=hand.id,
-                        player_id=player['id']
-                    ).first()
-                    if hand_player:
-                        hand_player.turn_card = card_to_string(player['turn_card'])
-                        db.session.commit()
+            record_player_card(game_state, player['id'], 'turn_card', player['turn_card'])
         game_state['timer'] = timer_config['turn_draw']
         game_state['current_bet'] = 0
         game_state['current_player_index'] = 0
@@ -103,13 +75,7 @@ def moveGameStateToNext(game_state, table_id):
 
         game_state['community_cards'] = kicked_cards + dealer_cards
 
-        # Update DB
-        with app.app_context():
-            hand = Hand.query.get(game_state['current_hand'])
-            if hand:
-                hand.community_cards = cards_to_string(kicked_cards)
-                hand.dealer_cards = cards_to_string(dealer_cards)
-                db.session.commit()
+        record_board(game_state, kicked_cards, dealer_cards)
 
         game_state['timer'] = timer_config['board_reveal']
         start_timer('board_reveal', table_id)
@@ -126,12 +92,15 @@ def moveGameStateToNext(game_state, table_id):
     elif game_state['state'] == 'showdown':
         game_state['state'] = 'end'
 
-        from helpers import calculate_side_pots, get_winner, determine_hand_strength
+        from helpers import calculate_side_pots, get_winner, score_showdown
+
+        # Step 1: Evaluate every live hand once
+        score_showdown(game_state)
 
-        # Step 1: Calculate side pots
+        # Step 2: Calculate side pots
         side_pots = calculate_side_pots(game_state)
 
-        # Step 2: Determine winners for each pot
+        # Step 3: Determine winners for each pot
         awarded_players = []
 
         for pot in side_pots:
@@ -141,11 +110,6 @@ def moveGameStateToNext(game_state, table_id):
             if len(eligible_players) == 1:
                 winner = eligible_players[0]
             else:
-                # Evaluate hand strengths among eligible players
-                for player in eligible_players:
-                    player['final_hand'] = player['cards'] + [player['turn_card']] + game_state['community_cards']
-                    player['hand_strength'] = determine_hand_strength(player['final_hand'])
-
                 winner = max(eligible_players, key=lambda p: p['hand_strength'])
 
             # Award pot to winner
@@ -157,7 +121,7 @@ def moveGameStateToNext(game_state, table_id):
                 'is_main_winner': False
             })
 
-        # Step 3: Determine winner of the remaining main pot (if any)
+        # Step 4: Determine winner of the remaining main pot (if any)
         # If side pots consumed entire pot, this may be 0
         game_state['pot'] = sum(p.get('total_bet', 0) for p in game_state['players'])
         remaining_pot = game_state.get('pot', 0)
@@ -172,13 +136,11 @@ def moveGameStateToNext(game_state, table_id):
                 'is_main_winner': True
             })
 
-        # Optional: print or log who won which pot
-        print("🏆 Pot results:")
-        print(awarded_players)
+        log.debug('Pot results: %s', awarded_players)
         game_state['winners'] = []
 
         for winner in awarded_players:
-            print(f"→ Player {winner['username']} won {winner['amount']} chips")
+            log.info('Player %s won %s chips', winner['username'], winner['amount'])
 
             game_state['winners'].append({
                 'id': winner['id'],
@@ -239,6 +201,6 @@ def moveGameStateToNext(game_state, table_id):
         game_state['timer'] = timer_config['next_hand']  # 10 seconds before next hand
         start_timer('next_hand', table_id)
         
-    socketio.emit('game_state_update', game_state, room=f'table_{table_id}')
-    print('Moved game state from ' + old_game_state + ' to ' + game_state['state'])
+    broadcast_game_state(table_id, game_state)
+    log.debug('Moved game state from %s to %s', old_game_state, game_state['state'])
     
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+from evaluator import evaluate_hand, evaluate_hands
+
+def card_set_key(cards):
+    """Order-independent key for a set of cards: a 52-bit mask."""
+    key = 0
+    for card in cards:
+        key |= 1 << card
+    return key
+
+class HandCache:
+    """Bounded LRU cache of hand strengths keyed by card set."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # Evaluation happens outside the lock, so it is never held across a
+        # green thread switch under eventlet.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key):
+        with self._lock:
+            strength = self._entries.get(key)
+            if strength is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return strength
+
+    def _put(self, key, strength):
+        with self._lock:
+            self._entries[key] = strength
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def strength(self, cards):
+        """Return the strength of a hand, evaluating it only on a miss."""
+        key = card_set_key(cards)
+        strength = self._get(key)
+        if strength is None:
+            strength = evaluate_hand(cards)
+            self._put(key, strength)
+        return strength
+
+    def strengths(self, hands, board=()):
+        """Batch version of strength() for hands sharing the same board."""
+        board_key = card_set_key(board)
+        keys = [board_key | card_set_key(cards) for cards in hands]
+        results = [self._get(key) for key in keys]
+
+        missing = [i for i, strength in enumerate(results) if strength is None]
+        if missing:
+            evaluated = evaluate_hands([hands[i] for i in missing], board)
+            for i, strength in zip(missing, evaluated):
+                results[i] = strength
+                self._put(keys[i], strength)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+hand_cache = HandCache(int(os.getenv('HAND_CACHE_SIZE', 50_000)))
@@ -0,0 +1,129 @@
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from src.models.models import Hand, HandPlayer
+from src.models import db
+from card_utils import cards_to_string, card_to_string
+from write_behind import BatchWriter
+from log_config import get_logger
+
+logger = get_logger('hand_history')
+
+# Hand key -> hands.id, for hands this process has written
+hand_ids = OrderedDict()
+MAX_HAND_IDS = 10_000
+
+def _resolve_hand_ids(keys):
+    """Map hand keys to DB ids, asking the DB for keys written before a restart."""
+    missing = [key for key in keys if key not in hand_ids]
+    if missing:
+        for key, hand_id in db.session.execute(select(Hand.hand_key, Hand.id).where(Hand.hand_key.in_(missing))):
+            _remember(key, hand_id)
+    return {key: hand_ids.get(key) for key in keys}
+
+def _remember(key, hand_id):
+    hand_ids[key] = hand_id
+    while len(hand_ids) > MAX_HAND_IDS:
+        hand_ids.popitem(last=False)
+
+def _write_hand_batch(events):
+    """Apply a batch of hand history events in one transaction.
+
+    Updates to hands started in the same batch are folded into their
+    INSERTs; the rest become one UPDATE per hand or hand player.
+    """
+    new_hands = OrderedDict()
+    new_players = OrderedDict()
+    hand_updates = {}
+    player_updates = {}
+
+    for event in events:
+        key = event['hand_key']
+        if event['kind'] == 'hand_started':
+            new_hands[key] = dict(event['fields'], hand_key=key)
+            for player_id, initial_cards in event['players']:
+                new_players[(key, player_id)] = {'player_id': player_id, 'initial_cards': initial_cards}
+        elif event['kind'] == 'hand_updated':
+            target = new_hands[key] if key in new_hands else hand_updates.setdefault(key, {})
+            target.update(event['fields'])
+        elif event['kind'] == 'player_updated':
+            player_key = (key, event['player_id'])
+            target = new_players.get(player_key) if key in new_hands else player_updates.setdefault(player_key, {})
+            if target is not None:
+                target.update(event['fields'])
+
+    inserted = {}
+    if new_hands:
+        hands = [Hand(**fields) for fields in new_hands.values()]
+        db.session.add_all(hands)
+        db.session.flush()
+        inserted = {hand.hand_key: hand.id for hand in hands}
+    if new_players:
+        db.session.execute(insert(HandPlayer), [
+            dict(fields, hand_id=inserted[key]) for (key, _), fields in new_players.items()
+        ])
+
+    ids = _resolve_hand_ids(set(hand_updates) | {key for key, _ in player_updates})
+    for key, fields in hand_updates.items():
+        if ids[key] is None:
+            logger.warning('Dropping update for unknown hand %s', key)
+            continue
+        db.session.execute(update(Hand).where(Hand.id == ids[key]).values(**fields))
+    for (key, player_id), fields in player_updates.items():
+        if ids[key] is None:
+            logger.warning('Dropping update for unknown hand %s', key)
+            continue
+        db.session.execute(update(HandPlayer).where(
+            HandPlayer.hand_id == ids[key],
+            HandPlayer.player_id == player_id
+        ).values(**fields))
+
+    db.session.commit()
+    for key, hand_id in inserted.items():
+        _remember(key, hand_id)
+
+hand_writer = BatchWriter(
+    'hand_history',
+    _write_hand_batch,
+    max_batch=int(os.getenv('HAND_HISTORY_BATCH_SIZE', 200)),
+    max_delay=float(os.getenv('HAND_HISTORY_BATCH_DELAY', 0.5)),
+    max_queue=int(os.getenv('HAND_HISTORY_QUEUE_SIZE', 10_000))
+)
+
+def start_hand(game_state):
+    """Queue a new hand with every player's initial cards; its key becomes game_state['current_hand']."""
+    key = uuid.uuid4().hex
+    game_state['current_hand'] = key
+    hand_writer.submit({
+        'kind': 'hand_started',
+        'hand_key': key,
+        'fields': {
+            'game_id': game_state['game_id'],
+            'hand_number': 1,  # First hand
+            'deck_seed': game_state.get('deck_seed'),
+            'start_time': datetime.utcnow()
+        },
+        'players': [(player['id'], cards_to_string(player['cards'])) for player in game_state['players']]
+    })
+
+def record_board(game_state, kicked_cards, dealer_cards):
+    if not game_state.get('current_hand'):
+        return
+    hand_writer.submit({
+        'kind': 'hand_updated',
+        'hand_key': game_state['current_hand'],
+        'fields': {'community_cards': cards_to_string(kicked_cards), 'dealer_cards': cards_to_string(dealer_cards)}
+    })
+
+def record_player_card(game_state, player_id, field, card):
+    """Queue one of a player's killed_card, kicked_card or turn_card."""
+    if not game_state.get('current_hand'):
+        return
+    hand_writer.submit({
+        'kind': 'player_updated',
+        'hand_key': game_state['current_hand'],
+        'player_id': player_id,
+        'fields': {field: card_to_string(card)}
+    })
@@ -1,12 +1,17 @@
 
-from main import game_states, socketio, app, timer_config
-from card_utils import deal_cards, card_to_string, cards_to_string
+from main import game_states, socketio, timer_config
+from card_utils import card_to_string
+from broadcast import broadcast_game_state
+from hand_history import record_player_card
 from timer import start_timer
-from src.models.models import Table, Game, GamePlayer, Hand, HandPlayer
+from src.models.models import Table, Game
 from src.models import db
 from datetime import datetime
+from log_config import get_logger, table_logger
 import random
 
+logger = get_logger('helpers')
+
 def find_suitable_table(chips):
     """Find or create a suitable table based on player's chips."""
     # Define table tiers
@@ -28,11 +33,10 @@ def find_suitable_table(chips):
         suitable_tier = tiers[0]  # Default to beginner table
     
     # Find an available table in this tier
-    with app.app_context():
-        available_table = Table.query.filter_by(
-            min_chips=suitable_tier['min_chips'],
-            status='waiting'
-        ).first()
+    available_table = Table.query.filter_by(
+        min_chips=suitable_tier['min_chips'],
+        status='waiting'
+    ).first()
     
     if not available_table:
         # Create a new table
@@ -45,54 +49,131 @@ def find_suitable_table(chips):
     
     return available_table
 
+def end_stale_games():
+    """End the games a previous run left active on this worker's tables that were not restored.
+
+    Nobody is seated at them any more, but their GamePlayer rows would
+    keep the seats taken until the table looked full for good.
+    """
+    from sharding import is_local
+    stale = [game for game in Game.query.filter_by(status='active')
+             if is_local(game.table_id) and game.table_id not in game_states]
+    for game in stale:
+        game.status = 'ended'
+        game.end_time = datetime.utcnow()
+    db.session.commit()
+    if stale:
+        logger.info('Ended %d games left active by the last run', len(stale))
+
+def new_game_state(game_id, deck):
+    """In-memory state of a table that is waiting for players, with its first hand shuffled."""
+    return {
+        'game_id': game_id,
+        'players': [],
+        'state': 'waiting',
+        'deck': deck,
+        'deck_seed': deck.shuffle(),
+        'pot': 0,
+        'current_hand': None,
+        'timer': None,
+        'chat_enabled': True
+    }
+
+def seat_player(game_state, table_id, player_id, username, chips, seat):
+    """Add a player to the table, starting the game once two are seated."""
+    game_state['players'].append({
+        'id': player_id,
+        'username': username,
+        'chips': chips,
+        'seat': seat,
+        'status': 'active'
+    })
+
+    if len(game_state['players']) >= 2 and game_state['state'] == 'waiting':
+        from game import moveGameStateToNext
+        moveGameStateToNext(game_state, table_id)
+
+def apply_player_action(game_state, table_id, player_id, action_type, action_data):
+    """Apply a kill/kick or betting action to the table; False if its state takes no actions."""
+    # Fix gamestate. This is important for debug mode.
+    if action_type == 'kill':
+        game_state['state'] = 'choose_trash'
+    elif action_type == 'kick':
+        game_state['state'] = 'choose_tango'
+    
+    # Fix from debug states
+    if action_type == 'bet' and game_state['state'] == 'turn_draw':
+        game_state['state'] = 'post_turn_betting'
+        game_state['current_player_index'] = 0
+
+    # Fix from debug states
+    if action_type == 'bet' and game_state['state'] == 'board_reveal':
+        game_state['state'] = 'final_betting'
+        game_state['current_player_index'] = 0
+
+    # Process action based on game state and action type
+    if game_state['state'] == 'choose_trash':
+        if action_type in ['kill']:
+            process_classification_action(player_id, table_id, action_type, action_data)
+    elif game_state['state'] == 'choose_tango':
+        if action_type in ['kick']:
+            process_classification_action(player_id, table_id, action_type, action_data)
+    elif game_state['state'] in ['ante']:
+        if action_type in ['bet']:
+            process_betting_action(player_id, table_id, action_type, action_data)
+    elif game_state['state'] in ['pre_kick_betting', 'post_turn_betting', 'final_betting']:
+        if action_type in ['check', 'bet', 'fold']:
+            process_betting_action(player_id, table_id, action_type, action_data)
+    else:
+        return False
+    return True
+
 def start_game(table_id):
     """Start a new game at the table."""
     table_id = int(table_id)
     game_state = game_states.get(table_id)
     
     if not game_state:
-        print('Invalid table ID or game state not found.')
+        logger.warning('Invalid table ID or game state not found: %s', table_id)
         return
     
     # Update game state
     from game import moveGameStateToNext
     moveGameStateToNext(game_state, table_id)
 
-def process_kill_card(player, hand_player):
+def process_kill_card(game_state, player):
     try:
         if player['cards'] is None or len(player['cards']) < 3:
-            print('Invalid player cards for kill action.')
+            logger.warning('Invalid player cards for kill action.')
             return
         
-        # Update database
-        with app.app_context():
-            killed_index = player['decisions']['kill']
-            killed_card = player['cards'][killed_index]
-            hand_player.killed_card = card_to_string(killed_card)
-            # Remove the killed card from the player's cards
-            player['cards'].pop(killed_index)
-            db.session.commit()
+        killed_index = player['decisions']['kill']
+        killed_card = player['cards'][killed_index]
+        # Remove the killed card from the player's cards
+        player['cards'].pop(killed_index)
+        player['killed_card'] = killed_card
+        record_player_card(game_state, player['id'], 'killed_card', killed_card)
     except:
-        print('Error processing kill card.')
+        logger.exception('Error processing kill card.')
 
-def process_kick_card(player, hand_player):
+def process_kick_card(game_state, player):
     try:
         if player['cards'] is None or len(player['cards']) < 2:
-            print('Invalid player cards for kick action.')
+            logger.warning('Invalid player cards for kick action.')
             return
         
         kicked_index = player['decisions']['kick']
         kicked_card = player['cards'][kicked_index]
-        kicked_card['is_tango'] = True
-        hand_player.kicked_card = card_to_string(kicked_card)
-        db.session.commit()
+        player['kicked_card'] = kicked_card
+        record_player_card(game_state, player['id'], 'kicked_card', kicked_card)
     except:
-        print('Error processing kick card.')
+        logger.exception('Error processing kick card.')
 
 
 def process_classification_action(player_id, table_id, action_type, action_data):
-    print('Processing classification action:', player_id, action_type, action_data)
     """Process a classification action (kill/kick)."""
+    log = table_logger(logger, table_id)
+    log.debug('Processing classification action: %s %s %s', player_id, action_type, action_data)
     game_state = game_states.get(table_id)
     
     if not game_state or game_state['state'] not in ['choose_trash', 'choose_tango']:
@@ -111,26 +192,10 @@ def process_classification_action(player_id, table_id, action_type, action_data)
     
     # Set the new decision
     player.setdefault('decisions', {'kill': None, 'kick': None})[action_type] = card_index
-    # Debug
-    if 'current_hand' not in game_state or game_state['current_hand'] is None:
-        game_state['current_hand'] = 0
-
-    # Update database
-    with app.app_context():
-        hand = Hand.query.get(game_state['current_hand'])
-        if hand:
-            hand_player = HandPlayer.query.filter_by(
-                hand_id=hand.id,
-                player_id=player_id
-            ).first()
-            
-            if hand_player:
-                # Convert the killed card index to string and assign it
-                if action_type == 'kill':
-                    process_kill_card(player, hand_player)
-                elif action_type == 'kick':
-                    process_kick_card(player, hand_player)
-                    db.session.commit()
+    if action_type == 'kill':
+        process_kill_card(game_state, player)
+    elif action_type == 'kick':
+        process_kick_card(game_state, player)
 
     # Check if all players have made all decisions
     all_decisions_made = True
@@ -139,21 +204,21 @@ def process_classification_action(player_id, table_id, action_type, action_data)
         for p in game_state['players']:
             if None in [p['decisions']['kill']]:
                 all_decisions_made = False
-                print('all decisions not yet made. continuing for all players to make a decision...')
+                log.debug('all decisions not yet made. continuing for all players to make a decision...')
                 break
         
         if all_decisions_made:
-            print('all decisions have been made!')
+            log.debug('all decisions have been made!')
             moveGameStateToNext(game_state, table_id)
     elif game_state['state'] == 'choose_tango':
         for p in game_state['players']:
             if None in [p['decisions']['kick']]:
                 all_decisions_made = False
-                print('all decisions not yet made. continuing for all players to make a decision...')
+                log.debug('all decisions not yet made. continuing for all players to make a decision...')
                 break
         
         if all_decisions_made:
-            print('all decisions have been made!')
+            log.debug('all decisions have been made!')
             moveGameStateToNext(game_state, table_id)
     else:
         # invalid
@@ -188,26 +253,27 @@ def player_is_active(player):
     return True
 
 def move_bet_to_next_player(game_state, next_player_index, table_id):
-    print('Moving to next player for betting... Timer resetting...')
+    table_logger(logger, table_id).debug('Moving to next player for betting... Timer resetting...')
     game_state['current_player_index'] = next_player_index
     game_state['timer'] = timer_config['betting']
     start_timer('betting', table_id)
     # TODO: I think we don't need code below?
     from main import socketio
-    socketio.emit('game_state_update', game_state, room=f'table_{table_id}')
+    broadcast_game_state(table_id, game_state)
 
 def is_betting_allowed_from_game_state(game_state):
     if game_state or game_state['state'] in ['ante', 'pre_kick_betting', 'post_turn_betting', 'final_betting']:
         return True
     
-    print(f"Error processing betting, invalid game state: {game_state}")
+    logger.warning('Error processing betting, invalid game state: %s', game_state)
     return False
 
 
 def process_betting_action(player_id, table_id, action_type, action_data):
     """Process a betting action (check/bet/fold)."""
     from game import moveGameStateToNext
-    print('...processing player betting: ' + str(player_id) + ' ' + str(action_type))
+    log = table_logger(logger, table_id)
+    log.debug('...processing player betting: %s %s', player_id, action_type)
     game_state = game_states.get(table_id)
     
     if not is_betting_allowed_from_game_state(game_state):
@@ -239,11 +305,11 @@ def process_betting_action(player_id, table_id, action_type, action_data):
         bet_amount = action_data.get('amount', 0)
         
         if bet_amount <= 0 or bet_amount > player['chips']:
-            print('Invalid bet amount!')
+            log.warning('Invalid bet amount!')
             return False
             
         if not is_betting_allowed_from_game_state(game_state):
-            print('Betting is not allowed.')
+            log.warning('Betting is not allowed.')
             return False
         
         player['chips'] -= bet_amount
@@ -266,7 +332,7 @@ def process_betting_action(player_id, table_id, action_type, action_data):
         elif game_state['state'] in ['final_betting']:
             player['last_action'] = f'final_bet {bet_amount}'
         else:
-            print('Invalid game state')
+            log.warning('Invalid game state')
             return False
         player['status'] = f'betted {bet_amount}'
     
@@ -281,7 +347,7 @@ def process_betting_action(player_id, table_id, action_type, action_data):
         elif game_state['state'] in ['final_betting']:
             player['last_action'] = f'final_fold'
     else:
-        print('Invalid action type.')
+        log.warning('Invalid action type.')
         return False
     
     # Move to next player or next phase
@@ -289,7 +355,7 @@ def process_betting_action(player_id, table_id, action_type, action_data):
     
     if len(active_players) <= 1:
         # Only one player left, they win
-        print('Only one player left, ending hand...')
+        log.info('Only one player left, ending hand...')
         moveGameStateToNext(game_state, table_id)
         return True
     
@@ -327,8 +393,7 @@ def process_betting_action(player_id, table_id, action_type, action_data):
                 move_bet_to_next_player(game_state, next_player_index, table_id)
 
     except Exception as e:
-        # Optional: Add logging
-        print(f"Error processing betting round: {e}")
+        log.exception('Error processing betting round: %s', e)
         # Move to next player
         move_bet_to_next_player(game_state, next_player_index, table_id)
     
@@ -338,7 +403,7 @@ def process_betting_action(player_id, table_id, action_type, action_data):
 def calculate_side_pots(game_state):
     # Only calculate side pots if at least one player is all-in
     if not any(player.get('is_all_in') for player in game_state.get('players', [])):
-        print("No all-in players. No side pots needed.")
+        logger.debug('No all-in players. No side pots needed.')
         game_state['side_pots'] = []
         return []
 
@@ -372,8 +437,7 @@ def calculate_side_pots(game_state):
         # Remove players who have contributed all their chips
         active_players = [p for p in active_players if p['total_bet'] > 0]
 
-    print('BATMAN sidepots is:')
-    print(game_state['side_pots'])
+    logger.debug('Side pots: %s', game_state['side_pots'])
 
     return game_state['side_pots']
 
@@ -388,19 +452,31 @@ def get_winner(game_state):
         # Only one player left, they win
         winner = active_players[0]
     else:
-        # Compare hands
-        for player in active_players:
-            # Combine kept card, turn card, and community cards
-            player['final_hand'] = player['cards'] + [player['turn_card']] + game_state['community_cards']
-            
-            # Calculate hand strength (simplified for now)
-            player['hand_strength'] = determine_hand_strength(player['final_hand'])
-        
+        # Compare hands, reusing strengths already scored for this showdown
+        if any('hand_strength' not in p for p in active_players):
+            score_showdown(game_state)
+
         # Find player with highest hand strength
         winner = max(active_players, key=lambda p: p['hand_strength'])
 
     return winner
 
+def score_showdown(game_state):
+    """Evaluate every live hand once and store the strengths on the players."""
+    from hand_cache import hand_cache
+    community_cards = game_state.get('community_cards', [])
+    live_players = [p for p in get_active_players(game_state) if p.get('cards') is not None]
+
+    hands = []
+    for player in live_players:
+        # Combine kept card, turn card, and community cards
+        hand = player['cards'] + ([player['turn_card']] if player.get('turn_card') is not None else [])
+        player['final_hand'] = hand + community_cards
+        hands.append(hand)
+
+    for player, strength in zip(live_players, hand_cache.strengths(hands, community_cards)):
+        player['hand_strength'] = strength
+
 def end_hand(table_id):
     """End the current hand and determine the winner."""
     game_state = game_states.get(table_id)
@@ -414,9 +490,47 @@ def end_hand(table_id):
     
 
 def determine_hand_strength(cards):
-    """Calculate the strength of a poker hand (simplified version)."""
-    # This is a simplified version - in a real implementation, you would use a proper poker hand evaluator
-    # For now, just return a random value for demonstration
-    print('Determining hand strength for cards..')
-    from poker import calculate_hand_strength
-    return calculate_hand_strength(cards)
+    """Calculate the strength of a poker hand."""
+    from hand_cache import hand_cache
+    return hand_cache.strength(cards)
+
+def calculate_equity(cards, kicked_cards=(), num_players=2, dead_cards=(), samples=None, kicked_card=None,
+                     turn_card=None):
+    """Win/tie probabilities for each kill/kick choice, computed in the equity process pool."""
+    from equity import submit_equity
+    jobs = submit_equity(cards, kicked_cards, num_players, dead_cards, samples, kicked_card=kicked_card,
+                         turn_card=turn_card)
+
+    # Yield to the event loop instead of blocking on the futures
+    while not all(future.done() for _, future in jobs):
+        socketio.sleep(0.01)
+
+    results = []
+    for choice, future in jobs:
+        result = future.result()
+        results.append({
+            'kill': choice['kill'],
+            'kick': choice['kick'],
+            'kept_card': card_to_string(choice['kept_card']),
+            'kicked_card': card_to_string(choice['kicked_card']),
+            **result
+        })
+    return results
+
+def player_equity(game_state, player_id, samples=None):
+    """Equity for a seated player's current cards, from what that player can see.
+
+    Opponents' kicks only count once they are dealt into community_cards
+    at board_reveal; the player's own killed card is dead, once they have
+    kicked only that choice is left, and their turn card is fixed once dealt.
+    """
+    player = next((p for p in game_state['players'] if p['id'] == player_id), None)
+    if not player or not player.get('cards'):
+        return None
+
+    kicked_card = player.get('kicked_card')
+    board_cards = [card for card in game_state.get('community_cards') or [] if card != kicked_card]
+    dead_cards = [player['killed_card']] if player.get('killed_card') is not None else []
+    num_players = len(get_active_players(game_state))
+    return calculate_equity(player['cards'], board_cards, num_players, dead_cards, samples, kicked_card,
+                            player.get('turn_card'))
@@ -0,0 +1,201 @@
+import atexit
+import math
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from main import app, socketio
+from sharding import WORKER_INDEX
+from db_config import data_path
+from log_config import get_logger
+
+logger = get_logger('journal')
+
+JOURNAL = os.getenv('JOURNAL', 'true').lower() == 'true'
+# Seconds between fsyncs; a crash loses at most this much of the journal
+FLUSH_INTERVAL = float(os.getenv('JOURNAL_FLUSH_INTERVAL', 0.2))
+
+# Every record: sequence number, time, table ID, kind, payload length, then the payload
+HEADER = struct.Struct('>QdiBH')
+
+TABLE_CREATED = 1   # game ID, table seed, first deck seed
+PLAYER_JOINED = 2   # player ID, chips, seat, then the username in UTF-8
+PLAYER_LEFT = 3     # player ID
+PLAYER_ACTION = 4   # player ID, action, card index or amount (NaN if missing)
+TIMER_EXPIRED = 5   # phase, game state the countdown ran in
+DECK_SHUFFLED = 6   # seed of the new hand
+
+PAYLOADS = {
+    TABLE_CREATED: struct.Struct('>qqq'),
+    PLAYER_JOINED: struct.Struct('>qqB'),
+    PLAYER_LEFT: struct.Struct('>q'),
+    PLAYER_ACTION: struct.Struct('>qBd'),
+    TIMER_EXPIRED: struct.Struct('>BB'),
+    DECK_SHUFFLED: struct.Struct('>q'),
+}
+
+KIND_NAMES = {
+    TABLE_CREATED: 'table_created', PLAYER_JOINED: 'player_joined', PLAYER_LEFT: 'player_left',
+    PLAYER_ACTION: 'player_action', TIMER_EXPIRED: 'timer_expired', DECK_SHUFFLED: 'deck_shuffled',
+}
+
+# Codes are positions in these tuples, so only ever append to them
+ACTIONS = ('kill', 'kick', 'bet', 'check', 'fold')
+PHASES = ('card_draw', 'choose_trash', 'choose_tango', 'betting', 'turn_draw',
+          'board_reveal', 'showdown', 'end', 'next_hand')
+STATES = ('waiting', 'ante', 'card_draw', 'choose_trash', 'choose_tango', 'pre_kick_betting', 'turn_draw',
+          'post_turn_betting', 'board_reveal', 'final_betting', 'showdown', 'end', 'next_hand')
+
+JournalRecord = namedtuple('JournalRecord', 'seq time table_id kind data')
+
+def _value_key(action_type):
+    return 'card_index' if action_type in ('kill', 'kick') else 'amount'
+
+def _action_value(action_type, action_data):
+    value = (action_data or {}).get(_value_key(action_type))
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+def decode_payload(kind, payload):
+    fields = PAYLOADS[kind].unpack_from(payload)
+    if kind == TABLE_CREATED:
+        return {'game_id': fields[0], 'table_seed': fields[1], 'deck_seed': fields[2]}
+    if kind == PLAYER_JOINED:
+        username = payload[PAYLOADS[kind].size:].decode('utf-8', 'replace')
+        return {'player_id': fields[0], 'chips': fields[1], 'seat': fields[2], 'username': username}
+    if kind == PLAYER_LEFT:
+        return {'player_id': fields[0]}
+    if kind == PLAYER_ACTION:
+        player_id, action, value = fields
+        action_type = ACTIONS[action]
+        action_data = {}
+        if not math.isnan(value):
+            value = int(value) if value.is_integer() else value
+            action_data[_value_key(action_type)] = value
+        return {'player_id': player_id, 'action_type': action_type, 'action_data': action_data}
+    if kind == TIMER_EXPIRED:
+        return {'phase': PHASES[fields[0]], 'phase_state': STATES[fields[1]]}
+    return {'seed': fields[0]}
+
+def read_journal(path):
+    """Yield every complete record of a journal file, in order."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        seq, timestamp, table_id, kind, length = HEADER.unpack_from(data, offset)
+        end = offset + HEADER.size + length
+        if end > len(data):
+            break
+        yield JournalRecord(seq, timestamp, table_id, KIND_NAMES[kind],
+                            decode_payload(kind, data[offset + HEADER.size:end]))
+        offset = end
+
+class Journal:
+    """Append-only binary log of every input that changes a table.
+
+    Joins, leaves, player actions, timer expirations and deck seeds go in,
+    in the order the tables saw them, each with a sequence number that
+    keeps growing across restarts. replay.py rebuilds any table at any
+    sequence number from it. Appends go to a buffered file that is
+    fsynced every FLUSH_INTERVAL seconds and at exit.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.seq = 0
+        self.records = 0
+        self.bytes = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        """Continue the journal at path after its last complete record."""
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        end = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Only the headers are read; a torn last record from a crash is cut off
+            while end + HEADER.size <= len(data):
+                seq, _, _, _, length = HEADER.unpack_from(data, end)
+                if end + HEADER.size + length > len(data):
+                    break
+                self.seq = seq
+                end += HEADER.size + length
+            if end < len(data):
+                logger.warning('Cutting %d bytes of a torn record off the end of %s', len(data) - end, path)
+                os.truncate(path, end)
+        self._file = open(path, 'ab')
+        self.bytes = end
+
+    def _append(self, kind, table_id, payload):
+        if self._file is None:
+            return
+        with self._lock:
+            self.seq += 1
+            record = HEADER.pack(self.seq, time.time(), int(table_id), kind, len(payload)) + payload
+            self._file.write(record)
+            self.records += 1
+            self.bytes += len(record)
+
+    def table_created(self, table_id, game_id, deck):
+        self._append(TABLE_CREATED, table_id, PAYLOADS[TABLE_CREATED].pack(game_id, deck.table_seed, deck.seed))
+
+    def player_joined(self, table_id, player_id, username, chips, seat):
+        # Cut on a character boundary, so the username decodes the same on replay
+        name = username.encode('utf-8')[:1024].decode('utf-8', 'ignore').encode('utf-8')
+        self._append(PLAYER_JOINED, table_id, PAYLOADS[PLAYER_JOINED].pack(player_id, chips, seat) + name)
+
+    def player_left(self, table_id, player_id):
+        self._append(PLAYER_LEFT, table_id, PAYLOADS[PLAYER_LEFT].pack(player_id))
+
+    def player_action(self, table_id, player_id, action_type, action_data):
+        # Other action types never change a table
+        if action_type not in ACTIONS:
+            return
+        self._append(PLAYER_ACTION, table_id, PAYLOADS[PLAYER_ACTION].pack(
+            player_id, ACTIONS.index(action_type), _action_value(action_type, action_data)))
+
+    def timer_expired(self, table_id, phase, phase_state):
+        self._append(TIMER_EXPIRED, table_id,
+                     PAYLOADS[TIMER_EXPIRED].pack(PHASES.index(phase), STATES.index(phase_state)))
+
+    def deck_shuffled(self, table_id, seed):
+        self._append(DECK_SHUFFLED, table_id, PAYLOADS[DECK_SHUFFLED].pack(seed))
+
+    def flush(self):
+        if self._file is None:
+            return
+        with self._lock:
+            self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def stats(self):
+        return {'enabled': self._file is not None, 'path': self.path, 'seq': self.seq,
+                'records': self.records, 'bytes': self.bytes}
+
+journal = Journal()
+
+def journal_path():
+    """JOURNAL_PATH, else a file per worker next to the SQLite database."""
+    return os.getenv('JOURNAL_PATH') or data_path(app, f'journal-{WORKER_INDEX}.bin')
+
+def _flush_periodically():
+    while True:
+        socketio.sleep(FLUSH_INTERVAL)
+        try:
+            journal.flush()
+        except OSError:
+            logger.exception('Could not flush the journal')
+
+def start_journal():
+    """Open the journal so tables start recording their inputs (no-op with JOURNAL=false)."""
+    if not JOURNAL:
+        return
+    journal.open(journal_path())
+    socketio.start_background_task(_flush_periodically)
+    atexit.register(journal.flush)
@@ -0,0 +1,49 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s [table=%(table_id)s] %(message)s'
+
+_listener = None
+
+class TableContextFilter(logging.Filter):
+    """Give every record the per-table context fields the format expects."""
+
+    def filter(self, record):
+        if not hasattr(record, 'table_id'):
+            record.table_id = '-'
+        return True
+
+def setup_logging():
+    """Send all game logs through a queue so stdout is written by a listener thread.
+
+    Callers only pay for enqueueing a record; messages below LOG_LEVEL are
+    discarded before any formatting happens.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    stream_handler.addFilter(TableContextFilter())
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger('tango')
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+
+def get_logger(name):
+    """Return the logger for a game module."""
+    return logging.getLogger(f'tango.{name}')
+
+def table_logger(logger, table_id):
+    """Wrap a logger so its records carry the table id."""
+    return logging.LoggerAdapter(logger, {'table_id': table_id})
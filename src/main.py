@@ -5,14 +5,19 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask
 from flask_socketio import SocketIO
 from src.models import db
-import uuid
 
 load_dotenv()  # Load from .env file
 
+from log_config import setup_logging
+setup_logging()
+
+from db_config import database_uri, engine_options
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') + '_' +  uuid.uuid4().hex + '.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 timer_config = {
@@ -27,12 +32,30 @@ timer_config = {
     'next_hand': 5,
 }
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Token buckets per socket event, as (events per second, burst), per connection and per table
+rate_limit_config = {
+    'join_table': {'connection': (0.5, 3)},
+    'leave_table': {'connection': (0.5, 3)},
+    'player_action': {'connection': (5, 10), 'table': (20, 40)},
+    'chat_message': {'connection': (1, 5), 'table': (5, 15)},
+    'equity_request': {'connection': (1, 3), 'table': (5, 10)},
+    'resync_request': {'connection': (1, 5)},
+}
+
+# Initialize SocketIO; with several workers, room emits are relayed between them
+from sharding import client_manager_from_env
+socketio_options = {'cors_allowed_origins': '*'}
+client_manager = client_manager_from_env()
+if client_manager is not None:
+    socketio_options['client_manager'] = client_manager
+socketio = SocketIO(app, **socketio_options)
 
 # Initialize database
 db.init_app(app)
 
+from sql_stats import start_sql_stats
+start_sql_stats()
+
 # Card utilities
 import card_utils
 
@@ -44,9 +67,20 @@ import routes
 import socket_handler
 import helpers
 
-# Create database tables
+# Bring back the tables that were live before a restart
+from snapshot import start_snapshots
+start_snapshots()
+
+from journal import start_journal
+start_journal()
+
+from shard_rpc import start_rpc_server
+start_rpc_server()
+
+# Create database tables, then end the games of the last run whose tables did not come back
 with app.app_context():
     db.create_all()
+    helpers.end_stale_games()
 
 if __name__ == '__main__':
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
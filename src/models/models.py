@@ -5,7 +5,7 @@ class Player(db.Model):
     __tablename__ = 'players'
     
     id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.String(255), nullable=False)
+    session_id = db.Column(db.String(255), nullable=False, unique=True, index=True)
     username = db.Column(db.String(255), nullable=True)
     chips = db.Column(db.Integer, default=100)
     is_permanent = db.Column(db.Boolean, default=False)
@@ -61,6 +61,9 @@ class Hand(db.Model):
     end_time = db.Column(db.DateTime, nullable=True)
     community_cards = db.Column(db.String(255), nullable=True)
     dealer_cards = db.Column(db.String(255), nullable=True)
+    deck_seed = db.Column(db.BigInteger, nullable=True)
+    # Assigned in memory when the hand starts, before the row is written
+    hand_key = db.Column(db.String(32), nullable=True, unique=True, index=True)
     
     hand_players = db.relationship('HandPlayer', backref='hand', lazy=True)
 
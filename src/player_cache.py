@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from src.models.models import Player
+
+# What socket handlers need to know about a player, without a DB row
+PlayerIdentity = namedtuple('PlayerIdentity', 'id session_id username chips is_permanent')
+
+def identity_of(player):
+    return PlayerIdentity(player.id, player.session_id, player.username, player.chips, player.is_permanent)
+
+class PlayerCache:
+    """Bounded LRU cache from session id to player identity.
+
+    Entries are written through whenever a route or handler commits a
+    change to the player, and the other workers drop their copy. Entries
+    also expire after ttl seconds, in case such a notice is lost, and
+    anything that moves chips reads the Player row via refresh(). A session looked up from a socket
+    connection stays bound to that sid, and is never evicted, until the
+    client disconnects.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        # Session ID -> (identity, expiry time)
+        self._entries = OrderedDict()
+        # Socket sid -> session ID, and session ID -> sids bound to it
+        self._bound = {}
+        self._session_sids = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, identity):
+        with self._lock:
+            self._entries[identity.session_id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity.session_id)
+            self._evict()
+
+    def _evict(self):
+        # Sessions bound to a connection are moved to the back instead of evicted
+        skipped = 0
+        while len(self._entries) > self.max_size and skipped < len(self._entries):
+            session_id = next(iter(self._entries))
+            if session_id in self._session_sids:
+                self._entries.move_to_end(session_id)
+                skipped += 1
+            else:
+                del self._entries[session_id]
+                self.evictions += 1
+
+    def _bind(self, sid, session_id):
+        with self._lock:
+            if self._bound.get(sid) == session_id:
+                return
+            self._unbind_locked(sid)
+            self._bound[sid] = session_id
+            self._session_sids.setdefault(session_id, set()).add(sid)
+
+    def _unbind_locked(self, sid):
+        session_id = self._bound.pop(sid, None)
+        if session_id is not None:
+            sids = self._session_sids.get(session_id, set())
+            sids.discard(sid)
+            if not sids:
+                self._session_sids.pop(session_id, None)
+
+    def lookup(self, session_id, sid=None):
+        """Return the identity for a session id, loading it on a miss; None if there is no such player."""
+        if not session_id:
+            return None
+        identity = self._get(session_id)
+        if identity is None:
+            player = Player.query.filter_by(session_id=session_id).first()
+            if not player:
+                return None
+            identity = identity_of(player)
+            self._put(identity)
+        if sid is not None:
+            self._bind(sid, session_id)
+        return identity
+
+    def refresh(self, session_id, sid=None):
+        """Like lookup(), but always reads the Player row, e.g. to seat the player with their current chips."""
+        self.invalidate(session_id)
+        return self.lookup(session_id, sid)
+
+    def update(self, player):
+        """Write through a Player row whose changes were just committed."""
+        from shard_rpc import notify_workers
+        self._put(identity_of(player))
+        notify_workers('player_changed', session_id=player.session_id)
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def unbind(self, sid):
+        """Release the session bound to a disconnected socket."""
+        with self._lock:
+            self._unbind_locked(sid)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'bound_sockets': len(self._bound),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+player_cache = PlayerCache(int(os.getenv('PLAYER_CACHE_SIZE', 10_000)), float(os.getenv('PLAYER_CACHE_TTL', 300)))
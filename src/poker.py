@@ -1,5 +1,8 @@
 from collections import Counter
 from itertools import combinations
+from log_config import get_logger
+
+logger = get_logger('poker')
 
 def rank_to_value(rank):
     rank_map = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7,
@@ -110,12 +113,13 @@ def get_best_hand(cards):
 
 def calculate_hand_strength(cards):
     """Calculate hand strength from 7 poker cards."""
-    print("Calculating hand strength for cards:")
-    print(cards)
+    logger.debug('Calculating hand strength for cards: %s', cards)
 
     hand_rank, high_cards = get_best_hand(cards)
-    print(f"Hand rank: {hand_rank}, High cards: {high_cards}")
+    logger.debug('Hand rank: %s, High cards: %s', hand_rank, high_cards)
+
+    return encode_strength(hand_rank, high_cards)
 
-    # Combine rank with high cards for a sortable value
-    strength = hand_rank * 1_000_000 + sum(hc * (10 ** i) for i, hc in enumerate(high_cards[::-1]))
-    return strength
+def encode_strength(hand_rank, high_cards):
+    """Combine rank with high cards for a sortable value."""
+    return hand_rank * 1_000_000 + sum(hc * (10 ** i) for i, hc in enumerate(high_cards[::-1]))
@@ -0,0 +1,137 @@
+import functools
+import threading
+from flask import request
+from main import socketio, rate_limit_config
+from log_config import get_logger
+from scheduler import scheduler
+
+logger = get_logger('rate_limit')
+
+# A rejected client hears about it at most this often; later rejections are dropped silently
+NOTIFY_INTERVAL = 1.0
+
+class TokenBucket:
+    """Allows `rate` events per second on average and bursts of up to `burst`."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = scheduler.clock.monotonic()
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self):
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate else None
+
+class RateLimiter:
+    """Token buckets per (connection, event) and per (table, event), from rate_limit_config.
+
+    A connection's buckets live on the worker its client is connected to, a
+    table's on the worker that owns the table. Buckets refill on the scheduler's clock, so limits follow game time
+    when hands are simulated.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # (scope, sid or table ID) -> {event: TokenBucket}
+        self._buckets = {}
+        # sid -> when it was last told it is being rate limited
+        self._notified = {}
+        self._lock = threading.Lock()
+        # Event -> counters
+        self._stats = {}
+
+    def _bucket(self, scope, key, event):
+        buckets = self._buckets.setdefault((scope, key), {})
+        bucket = buckets.get(event)
+        if bucket is None:
+            rate, burst = self.config[event][scope]
+            bucket = buckets[event] = TokenBucket(rate, burst)
+        return bucket
+
+    def _count(self, event, counter):
+        stats = self._stats.setdefault(event, {
+            'allowed': 0, 'throttled': 0, 'dropped': 0, 'by_connection': 0, 'by_table': 0
+        })
+        stats[counter] += 1
+
+    def admit(self, event, scope, key):
+        """Take a token for the event from a connection's (key = sid) or a table's bucket.
+
+        Returns (True, None) if the event may run, else (False, retry_after).
+        """
+        limits = self.config.get(event) or {}
+        if scope not in limits or key is None:
+            return True, None
+
+        now = scheduler.clock.monotonic()
+        with self._lock:
+            bucket = self._bucket(scope, str(key) if scope == 'table' else key, event)
+            if not bucket.take(now):
+                self._count(event, f'by_{scope}')
+                return False, bucket.retry_after()
+            # The table check comes last when the event has one
+            if scope == 'table' or 'table' not in limits:
+                self._count(event, 'allowed')
+            return True, None
+
+    def should_notify(self, event, sid):
+        """Whether to tell the client about this rejection (throttled) or drop it silently."""
+        now = scheduler.clock.monotonic()
+        with self._lock:
+            if now - self._notified.get(sid, 0) < NOTIFY_INTERVAL:
+                self._count(event, 'dropped')
+                return False
+            self._notified[sid] = now
+            self._count(event, 'throttled')
+            return True
+
+    def forget_sid(self, sid):
+        with self._lock:
+            self._notified.pop(sid, None)
+            self._buckets.pop(('connection', sid), None)
+
+    def forget_table(self, table_id):
+        with self._lock:
+            self._buckets.pop(('table', str(table_id)), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limits': {event: {scope: {'rate': rate, 'burst': burst} for scope, (rate, burst) in limits.items()}
+                           for event, limits in self.config.items()},
+                'events': {event: dict(stats) for event, stats in self._stats.items()},
+            }
+
+rate_limiter = RateLimiter(rate_limit_config)
+
+def rate_limited(event, scope='connection'):
+    """Reject a socket event that exceeds its limits before the handler does any work.
+
+    The connection limit is checked where the event arrives. The table
+    limit (scope='table') goes below @owned_by_table, so every worker's
+    events for a table are charged to one bucket on its owner.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(data=None):
+            table_id = data.get('table_id') if isinstance(data, dict) else None
+            key = table_id if scope == 'table' else request.sid
+            allowed, retry_after = rate_limiter.admit(event, scope, key)
+            if allowed:
+                return handler(data)
+
+            if rate_limiter.should_notify(event, request.sid):
+                logger.debug('Rate limited %s from %s (table %s)', event, request.sid, table_id)
+                socketio.emit('rate_limited', {'event': event, 'retry_after': retry_after}, to=request.sid)
+        return wrapper
+    return decorator
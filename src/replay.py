@@ -0,0 +1,121 @@
+"""Rebuild a table from the action journal, as it was at any sequence number.
+
+Usage:
+    python3 src/replay.py JOURNAL --table 12 [--seq 4810] [--trace]
+
+Feeds the table's journaled inputs (joins, leaves, player actions, timer
+expirations) through the same code the server runs -- new_game_state,
+seat_player, apply_player_action and the PHASE_TIMERS timeouts -- and
+prints the table's state after the last record at or before --seq. Deck
+seeds in the journal are checked against the replayed deck, so a replay
+that drifts from what happened stops with ReplayDivergence.
+
+Importing this module imports the server in an isolated setup (no
+journal, no snapshots, a throwaway database, timers that never fire),
+so it must be imported before main.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+os.environ['JOURNAL'] = 'false'
+os.environ['SNAPSHOTS'] = 'false'
+os.environ['TIMER_BACKGROUND'] = 'false'
+os.environ['TIMER_CLOCK'] = 'simulated'
+os.environ['WORKER_COUNT'] = '1'
+os.environ['SQL_STATS_LOG_INTERVAL'] = '0'
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'replay.db')
+os.environ.pop('DATABASE_INSTANCE', None)
+os.environ.setdefault('SECRET_KEY', 'replay')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SRC))
+sys.path.insert(0, SRC)
+
+import main
+from main import game_states
+from card_utils import Deck, serialize_game_state
+from helpers import new_game_state, seat_player, apply_player_action
+from timer import PHASE_TIMERS, cancel_timer
+from journal import read_journal
+
+class ReplayDivergence(Exception):
+    """The replayed table dealt from a different deck than the journaled one."""
+
+def _check_seed(record, seed):
+    expected = record.data['deck_seed' if record.kind == 'table_created' else 'seed']
+    if expected != seed:
+        raise ReplayDivergence(f'Record {record.seq}: journal has deck seed {expected}, replay has {seed}')
+
+def apply_record(record):
+    """Apply one journal record to its table in game_states."""
+    table_id = record.table_id
+    data = record.data
+    game_state = game_states.get(table_id)
+
+    if record.kind == 'table_created':
+        cancel_timer(table_id)
+        game_states[table_id] = new_game_state(data['game_id'], Deck(data['table_seed']))
+        _check_seed(record, game_states[table_id]['deck_seed'])
+    elif game_state is None:
+        # The table was created before the start of the journal
+        raise ReplayDivergence(f'Record {record.seq}: {record.kind} for table {table_id}, which does not exist')
+    elif record.kind == 'player_joined':
+        seat_player(game_state, table_id, data['player_id'], data['username'], data['chips'], data['seat'])
+    elif record.kind == 'player_left':
+        game_state['players'] = [p for p in game_state['players'] if p['id'] != data['player_id']]
+        if not game_state['players']:
+            game_states.pop(table_id, None)
+            cancel_timer(table_id)
+    elif record.kind == 'player_action':
+        apply_player_action(game_state, table_id, data['player_id'], data['action_type'], data['action_data'])
+    elif record.kind == 'timer_expired':
+        # A countdown only runs out in the state it was started in
+        if game_state['state'] != data['phase_state']:
+            raise ReplayDivergence(f"Record {record.seq}: {data['phase']} countdown ran out in "
+                                   f"{data['phase_state']}, replay is in {game_state['state']}")
+        cancel_timer(table_id)
+        PHASE_TIMERS[data['phase']]['timeout'](table_id, data['phase_state'])
+    elif record.kind == 'deck_shuffled':
+        _check_seed(record, game_state['deck_seed'])
+
+def replay_table(records, table_id, until_seq=None, on_record=None):
+    """Replay one table's records up to until_seq and return its game state (None if it is gone).
+
+    on_record(record, game_state) is called after each record is applied.
+    """
+    game_states.pop(table_id, None)
+    cancel_timer(table_id)
+    for record in records:
+        if until_seq is not None and record.seq > until_seq:
+            break
+        if record.table_id != table_id:
+            continue
+        with main.app.app_context():
+            apply_record(record)
+        if on_record:
+            on_record(record, game_states.get(table_id))
+    return game_states.get(table_id)
+
+def trace(record, game_state):
+    state = game_state['state'] if game_state else 'gone'
+    print(f'{record.seq:>8} {record.kind:<14} {json.dumps(record.data)} -> {state}', file=sys.stderr)
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('journal', help='journal file, e.g. src/instance/tango.db.journal-0.bin')
+    parser.add_argument('--table', type=int, required=True)
+    parser.add_argument('--seq', type=int, help='last sequence number to apply (default: all)')
+    parser.add_argument('--trace', action='store_true', help='print every applied record to stderr')
+    args = parser.parse_args()
+
+    game_state = replay_table(read_journal(args.journal), args.table, args.seq, trace if args.trace else None)
+    if game_state is None:
+        sys.exit(f'Table {args.table} does not exist at that point of the journal')
+    print(json.dumps(serialize_game_state(game_state), indent=2, default=str))
+
+if __name__ == '__main__':
+    main_()
@@ -1,10 +1,16 @@
 from main import app
+from card_utils import serialize_game_state, deserialize_game_state, string_to_cards
 from src.models.models import Player
 import uuid
 from src.models import db
 from datetime import datetime, timedelta
 from flask import request, jsonify, render_template, session
 import json
+from log_config import get_logger
+from shard_rpc import route_to_owner
+from player_cache import player_cache
+
+logger = get_logger('routes')
 
 @app.route('/')
 def index():
@@ -13,12 +19,13 @@ def index():
 
 
 @app.route('/api/next-state', methods=['POST'])
+@route_to_owner
 def next_game_state():
     data = request.json
-    game_state = data.get('game_state')
+    game_state = deserialize_game_state(data.get('game_state'))
     
-    print('Moving next game state from:')
     table_id = data.get('table_id')
+    logger.debug('Moving next game state from: %s', game_state.get('state'))
     from game import moveGameStateToNext
     
     state = game_state['state']
@@ -58,9 +65,98 @@ def next_game_state():
         moveGameStateToNext(game_state, table_id)
 
     return jsonify({
-        'game_state': game_state,
+        'game_state': serialize_game_state(game_state),
+    })
+
+@app.route('/api/equity', methods=['POST'])
+def get_equity():
+    """Win/tie probabilities for each kill/kick choice of a 3-card (or 2-card) hand."""
+    data = request.json
+    from helpers import calculate_equity
+    from equity import parse_samples
+
+    try:
+        cards = string_to_cards(','.join(data.get('cards', [])))
+        kicked_cards = string_to_cards(','.join(data.get('kicked_cards', [])))
+        dead_cards = string_to_cards(','.join(data.get('dead_cards', [])))
+        samples = parse_samples(data.get('samples'))
+        choices = calculate_equity(
+            cards, kicked_cards, int(data.get('num_players', 2)), dead_cards, samples
+        )
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid equity request: {e}'}), 400
+
+    return jsonify({
+        'choices': choices,
     })
 
+@app.route('/api/stats/hand-cache', methods=['GET'])
+def get_hand_cache_stats():
+    """Hit/miss/eviction counters of the hand-evaluation cache."""
+    from hand_cache import hand_cache
+    return jsonify(hand_cache.stats())
+
+@app.route('/api/stats/broadcasts', methods=['GET'])
+def get_broadcast_stats():
+    """Game state broadcasts requested versus sent after coalescing."""
+    from broadcast import broadcast_stats
+    return jsonify(broadcast_stats())
+
+@app.route('/api/stats/player-cache', methods=['GET'])
+def get_player_cache_stats():
+    """Hit/miss/eviction counters of the session to player cache."""
+    return jsonify(player_cache.stats())
+
+@app.route('/api/stats/rate-limits', methods=['GET'])
+def get_rate_limit_stats():
+    """Configured socket event limits and how many events each let through, throttled or dropped."""
+    from rate_limit import rate_limiter
+    return jsonify(rate_limiter.stats())
+
+@app.route('/api/stats/write-behind', methods=['GET'])
+def get_write_behind_stats():
+    """Queue depth, dropped items, retries and batch counters of the background DB writers."""
+    from chat import chat_writer
+    from hand_history import hand_writer
+    return jsonify({'chat': chat_writer.stats(), 'hand_history': hand_writer.stats()})
+
+@app.route('/api/stats/database', methods=['GET'])
+def get_database_stats():
+    """Connection pool usage and the SQLite settings in effect."""
+    from db_config import database_stats
+    return jsonify(database_stats(db.engine))
+
+@app.route('/api/stats/sql', methods=['GET'])
+def get_sql_stats():
+    """Statements, commits and repeated statements per socket event, route and timer phase."""
+    from sql_stats import sql_stats
+    return jsonify(sql_stats())
+
+@app.route('/api/stats/snapshots', methods=['GET'])
+def get_snapshot_stats():
+    """Snapshot writes, compactions and the last restore."""
+    from snapshot import snapshot_stats
+    return jsonify(snapshot_stats())
+
+@app.route('/api/stats/journal', methods=['GET'])
+def get_journal_stats():
+    """Records and bytes appended to the action journal."""
+    from journal import journal
+    return jsonify(journal.stats())
+
+@app.route('/api/stats/sharding', methods=['GET'])
+def get_sharding_stats():
+    """This worker's place in the pool and its forwarded-call counters."""
+    from shard_rpc import sharding_stats
+    return jsonify(sharding_stats())
+
+@app.route('/api/stats/timers', methods=['GET'])
+def get_timer_stats():
+    """Live phase countdowns, optionally for a single table."""
+    from timer import live_timers
+    table_id = request.args.get('table_id', type=int)
+    return jsonify({'timers': live_timers(table_id)})
+
 @app.route('/api/player', methods=['POST'])
 def get_player_in_session_or_create():
     """Create a new player or retrieve existing player by session ID."""
@@ -71,7 +167,7 @@ def get_player_in_session_or_create():
     if not session_id:
         session_id = str(uuid.uuid4())
     
-    player = Player.query.filter_by(session_id=session_id).first()
+    player = player_cache.lookup(session_id)
     
     if not player:
         if username:
@@ -80,6 +176,7 @@ def get_player_in_session_or_create():
             player = Player(session_id=session_id, chips=100)
         db.session.add(player)
         db.session.commit()
+        player_cache.update(player)
     
     return jsonify({
         'id': player.id,
@@ -110,6 +207,7 @@ def set_username():
     player.username = username
     player.is_permanent = True
     db.session.commit()
+    player_cache.update(player)
     
     return jsonify({
         'id': player.id,
@@ -147,6 +245,7 @@ def claim_chips():
     player.chips = 100
     player.last_free_chips = current_time
     db.session.commit()
+    player_cache.update(player)
     
     return jsonify({
         'id': player.id,
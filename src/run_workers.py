@@ -0,0 +1,80 @@
+"""Run the server as several worker processes, each owning a share of the tables.
+
+Usage:
+    python3 src/run_workers.py [--workers 4] [--port 5000] [--host 127.0.0.1]
+
+Worker i listens on port + i and owns every table whose id % workers == i.
+Clients may connect to any worker: events, /api/next-state calls and
+room broadcasts for a table are routed to and from its owner over Unix
+sockets in SHARD_DIR, a private directory made for the run unless set.
+All workers share one database (see db_config.py).
+"""
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+def start_worker(index, args, env):
+    worker_env = dict(env, WORKER_INDEX=str(index))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', os.path.join(SRC, 'main'), 'run',
+         '--host', args.host, '--port', str(args.port + index)],
+        env=worker_env
+    )
+
+def wait_for(path, process, timeout=30):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if process.poll() is not None or time.time() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--port', type=int, default=5000, help='port of worker 0')
+    parser.add_argument('--host', default='127.0.0.1')
+    args = parser.parse_args()
+
+    env = dict(os.environ, WORKER_COUNT=str(args.workers))
+    # mkdtemp makes the directory with mode 0700, so other users cannot reach the sockets
+    own_dir = 'SHARD_DIR' not in env
+    if own_dir:
+        env['SHARD_DIR'] = tempfile.mkdtemp(prefix='tango-shards-')
+
+    sys.path.insert(0, SRC)
+    os.environ['SHARD_DIR'] = env['SHARD_DIR']
+    from sharding import rpc_path
+
+    # Worker 0 creates the database tables before the others start
+    workers = [start_worker(0, args, env)]
+    if args.workers > 1 and not wait_for(rpc_path(0), workers[0]):
+        workers[0].terminate()
+        sys.exit('Worker 0 failed to start')
+    workers += [start_worker(index, args, env) for index in range(1, args.workers)]
+
+    def stop(*_):
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        stop()
+        for worker in workers:
+            worker.wait()
+    finally:
+        if own_dir:
+            shutil.rmtree(env['SHARD_DIR'], ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
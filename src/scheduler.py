@@ -0,0 +1,125 @@
+import heapq
+import itertools
+import os
+import threading
+from main import socketio
+from log_config import get_logger
+from clock import clock_from_env
+
+logger = get_logger('scheduler')
+
+# How often the scheduler task wakes up to look for due callbacks
+TICK = 0.05
+
+class TimerHandle:
+    """A scheduled callback that can be cancelled until it runs."""
+
+    __slots__ = ('deadline', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def remaining(self):
+        return max(0.0, self.deadline - scheduler.clock.monotonic())
+
+class Scheduler:
+    """Runs every table's timer callbacks from a single background task.
+
+    Deadlines live in a heap, so scheduling and firing cost O(log n) in the
+    number of pending timers no matter how many tables are open. Time comes
+    from a pluggable clock (see clock.py); with a SimulatedClock the
+    background task jumps straight to the next deadline. With background
+    set to False no task is started and a driver calls run_until_idle().
+    """
+
+    def __init__(self, clock, background=True):
+        self.clock = clock
+        self.background = background
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._task = None
+        self._batch_hooks = []
+
+    def set_clock(self, clock):
+        self.clock = clock
+
+    def add_batch_hook(self, hook):
+        """Call hook() after every batch of callbacks, e.g. to flush queued broadcasts."""
+        self._batch_hooks.append(hook)
+
+    def schedule(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds; returns a TimerHandle."""
+        handle = TimerHandle(self.clock.monotonic() + delay, callback, args)
+        with self._lock:
+            heapq.heappush(self._heap, (handle.deadline, next(self._counter), handle))
+            if self._task is None and self.background:
+                self._task = socketio.start_background_task(self._run)
+        return handle
+
+    def run_pending(self, now=None):
+        """Run every callback whose deadline has passed; return how many ran."""
+        if now is None:
+            now = self.clock.monotonic()
+        ran = 0
+        while True:
+            with self._lock:
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, _, handle = heapq.heappop(self._heap)
+            if handle.cancelled:
+                continue
+            try:
+                handle.callback(*handle.args)
+            except Exception:
+                logger.exception('Timer callback %s failed', getattr(handle.callback, '__name__', handle.callback))
+            ran += 1
+        if ran:
+            for hook in self._batch_hooks:
+                try:
+                    hook()
+                except Exception:
+                    logger.exception('Batch hook %s failed', getattr(hook, '__name__', hook))
+        return ran
+
+    def next_deadline(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def run_until_idle(self, max_callbacks=None):
+        """Advance the simulated clock deadline by deadline, running callbacks until none are left.
+
+        Returns how many callbacks ran. Stops early after max_callbacks.
+        """
+        ran = 0
+        while max_callbacks is None or ran < max_callbacks:
+            deadline = self.next_deadline()
+            if deadline is None:
+                break
+            self.clock.advance_to(deadline)
+            ran += self.run_pending()
+        return ran
+
+    def _run(self):
+        while True:
+            self.run_pending()
+            deadline = self.next_deadline()
+            if deadline is None:
+                # Wait in real time: sleeping a simulated clock returns at once and would spin
+                socketio.sleep(TICK)
+            elif self.clock.simulated:
+                self.clock.advance_to(deadline)
+                socketio.sleep(0)
+            else:
+                self.clock.sleep(TICK)
+
+    def __len__(self):
+        return len(self._heap)
+
+scheduler = Scheduler(clock_from_env(), os.getenv('TIMER_BACKGROUND', 'true').lower() == 'true')
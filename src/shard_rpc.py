@@ -0,0 +1,175 @@
+import functools
+import json
+import socket
+import threading
+import flask
+from flask_socketio import emit
+from main import app, socketio
+from sharding import WORKER_COUNT, WORKER_INDEX, owner_of, is_local, rpc_path, bind_unix_socket
+from log_config import get_logger
+
+logger = get_logger('shard_rpc')
+
+# Handler name -> socket event handler that runs on the table's owner
+table_handlers = {}
+
+# View name -> Flask view that runs on the table's owner
+table_routes = {}
+
+# Calls sent to other workers, calls served for them, and calls that could not be delivered
+shard_stats = {'forwarded': 0, 'served': 0, 'failed': 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        shard_stats[key] += 1
+
+def call_worker(index, request):
+    """Send one request to a worker's RPC socket and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(rpc_path(index))
+        with sock.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+            reply = json.loads(stream.readline())
+    if 'error' in reply:
+        raise RuntimeError(f"Worker {index} failed {request.get('name')}: {reply['error']}")
+    return reply
+
+def owned_by_table(table_of=None):
+    """Run a socket event handler on the worker that owns the event's table.
+
+    table_of(data) gives the table id (default: data['table_id']). Events
+    for tables owned by another worker are forwarded there with the
+    client's sid, so the handler's emits and room joins reach the client
+    through the shared client manager. The table id is left in flask.g.table_id.
+    """
+    def decorator(handler):
+        table_handlers[handler.__name__] = handler
+
+        @functools.wraps(handler)
+        def wrapper(data):
+            table_id = table_of(data) if table_of else (data or {}).get('table_id')
+            flask.g.table_id = table_id
+            if table_id is None or is_local(table_id):
+                return handler(data)
+
+            _count('forwarded')
+            try:
+                return call_worker(owner_of(table_id), {
+                    'kind': 'event',
+                    'name': handler.__name__,
+                    'table_id': table_id,
+                    'sid': flask.request.sid,
+                    'data': data
+                })['result']
+            except (OSError, RuntimeError, ValueError):
+                _count('failed')
+                logger.exception('Could not forward %s for table %s', handler.__name__, table_id)
+                emit('error', {'message': 'Table is not available right now'})
+        return wrapper
+    return decorator
+
+def route_to_owner(view):
+    """Serve a JSON route on the worker that owns the request's table_id."""
+    table_routes[view.__name__] = view
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        payload = flask.request.get_json(silent=True) or {}
+        table_id = payload.get('table_id')
+        if table_id is None or is_local(table_id):
+            return view(*args, **kwargs)
+
+        _count('forwarded')
+        try:
+            reply = call_worker(owner_of(table_id), {
+                'kind': 'route',
+                'name': view.__name__,
+                'path': flask.request.path,
+                'data': payload
+            })
+        except (OSError, ValueError):
+            _count('failed')
+            logger.exception('Could not forward %s for table %s', view.__name__, table_id)
+            return flask.jsonify({'error': 'Table is not available right now'}), 503
+        except RuntimeError as e:
+            return flask.jsonify({'error': str(e)}), 500
+        return flask.jsonify(reply['result']), reply['status']
+    return wrapper
+
+def notify_workers(name, **data):
+    """Tell every other worker about a change that may concern it (a disconnect, a player's new chips)."""
+    for index in range(WORKER_COUNT):
+        if index != WORKER_INDEX:
+            socketio.start_background_task(_notify_worker, index, name, data)
+
+def _notify_worker(index, name, data):
+    try:
+        call_worker(index, dict(data, kind='notify', name=name))
+    except (OSError, RuntimeError, ValueError):
+        logger.warning('Could not notify worker %d of %s', index, name)
+
+def _serve_request(request):
+    """Run a forwarded request as if it had arrived on this worker."""
+    kind = request['kind']
+    if kind == 'event':
+        with app.test_request_context('/'):
+            # The same request attributes Flask-SocketIO sets for its handlers
+            flask.request.sid = request['sid']
+            flask.request.namespace = '/'
+            flask.request.event = {'message': request['name'], 'args': (request['data'],)}
+            flask.g.table_id = request['table_id']
+            return {'result': table_handlers[request['name']](request['data'])}
+
+    if kind == 'route':
+        with app.test_request_context(request['path'], method='POST', json=request['data']):
+            response = app.process_response(app.make_response(table_routes[request['name']]()))
+            return {'result': response.get_json(), 'status': response.status_code}
+
+    if kind == 'notify' and request['name'] == 'disconnect':
+        from broadcast import unregister_sid
+        from player_cache import player_cache
+        from rate_limit import rate_limiter
+        unregister_sid(request['sid'])
+        player_cache.unbind(request['sid'])
+        rate_limiter.forget_sid(request['sid'])
+        return {'result': None}
+
+    if kind == 'notify' and request['name'] == 'player_changed':
+        from player_cache import player_cache
+        player_cache.invalidate(request['session_id'])
+        return {'result': None}
+
+    raise ValueError(f'Unknown request {kind} {request.get("name")}')
+
+def _serve_connection(conn):
+    with conn, conn.makefile('rwb') as stream:
+        for line in stream:
+            request = json.loads(line)
+            _count('served')
+            try:
+                reply = _serve_request(request)
+            except Exception as e:
+                logger.exception('Forwarded %s %s failed', request.get('kind'), request.get('name'))
+                reply = {'error': str(e)}
+            stream.write(json.dumps(reply).encode() + b'\n')
+            stream.flush()
+
+def _serve(server):
+    while True:
+        conn, _ = server.accept()
+        socketio.start_background_task(_serve_connection, conn)
+
+def start_rpc_server():
+    """Accept calls forwarded by the other workers (no-op when running a single process)."""
+    if WORKER_COUNT == 1:
+        return
+    server = bind_unix_socket(rpc_path(WORKER_INDEX), socket.SOCK_STREAM)
+    server.listen()
+    socketio.start_background_task(_serve, server)
+    logger.info('Worker %d of %d serving tables %d mod %d', WORKER_INDEX, WORKER_COUNT, WORKER_INDEX, WORKER_COUNT)
+
+def sharding_stats():
+    with _stats_lock:
+        return dict(shard_stats, worker_index=WORKER_INDEX, worker_count=WORKER_COUNT)
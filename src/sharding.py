@@ -0,0 +1,94 @@
+import os
+import pickle
+import socket
+import stat
+import tempfile
+import socketio
+from log_config import get_logger
+
+logger = get_logger('sharding')
+
+# Number of worker processes and which one this is. Table t is owned by worker t % WORKER_COUNT.
+WORKER_COUNT = max(1, int(os.getenv('WORKER_COUNT', 1)))
+WORKER_INDEX = int(os.getenv('WORKER_INDEX', 0))
+
+# Where the workers' Unix sockets live; every worker of a server must share it.
+# run_workers.py gives each run its own private directory.
+SHARD_DIR = os.getenv('SHARD_DIR', os.path.join(tempfile.gettempdir(), 'tango-shards'))
+
+# Largest pub/sub message we expect (a full table snapshot is a few KB)
+MAX_DATAGRAM = 1 << 20
+
+def owner_of(table_id):
+    """Index of the worker that owns a table."""
+    return int(table_id) % WORKER_COUNT
+
+def is_local(table_id):
+    return owner_of(table_id) == WORKER_INDEX
+
+def pubsub_path(index):
+    return os.path.join(SHARD_DIR, f'pubsub-{index}.sock')
+
+def rpc_path(index):
+    return os.path.join(SHARD_DIR, f'rpc-{index}.sock')
+
+def check_shard_dir():
+    """Create SHARD_DIR private to this user, or make sure an existing one is.
+
+    Anyone who can write to it could plant sockets that the workers would
+    publish table state and RPC requests to.
+    """
+    try:
+        os.mkdir(SHARD_DIR, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(SHARD_DIR)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f'{SHARD_DIR} must be a directory owned by this user with mode 0700 '
+                           f'(set SHARD_DIR to a private directory)')
+
+def bind_unix_socket(path, kind):
+    """Bind a Unix socket at path, replacing a stale one from an earlier run."""
+    check_shard_dir()
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, kind)
+    sock.bind(path)
+    return sock
+
+class UnixSocketManager(socketio.PubSubManager):
+    """Socket.IO client manager that relays room emits between workers over Unix datagram sockets.
+
+    Stands in for a Redis/Kombu message queue when every worker runs on
+    one machine, so multi-worker mode needs no external services.
+    """
+
+    name = 'unix'
+
+    def __init__(self, channel='tango', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._recv_sock = bind_unix_socket(pubsub_path(WORKER_INDEX), socket.SOCK_DGRAM)
+        self._recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_DATAGRAM)
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_DATAGRAM)
+
+    def _publish(self, data):
+        message = pickle.dumps(data)
+        for index in range(WORKER_COUNT):
+            if index == WORKER_INDEX:
+                continue
+            try:
+                self._send_sock.sendto(message, pubsub_path(index))
+            except OSError as e:
+                # The worker is not up (yet); it has no clients to deliver to
+                logger.warning('Could not publish %s to worker %d: %s', data.get('method'), index, e)
+
+    def _listen(self):
+        while True:
+            yield self._recv_sock.recv(MAX_DATAGRAM)
+
+def client_manager_from_env():
+    """The Socket.IO client manager for this worker, or None when running a single process."""
+    if WORKER_COUNT == 1:
+        return None
+    return UnixSocketManager()
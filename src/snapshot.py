@@ -0,0 +1,222 @@
+import atexit
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from main import app, socketio, game_states
+from sharding import WORKER_INDEX, is_local
+from db_config import data_path
+from log_config import get_logger, table_logger
+from scheduler import scheduler
+
+logger = get_logger('snapshot')
+
+SNAPSHOTS = os.getenv('SNAPSHOTS', 'true').lower() == 'true'
+# Seconds between writes of the tables that changed
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', 0.5))
+# Rewrite the file with only the latest record per table once it is this many times their size
+COMPACT_RATIO = float(os.getenv('SNAPSHOT_COMPACT_RATIO', 4))
+COMPACT_MIN_BYTES = int(os.getenv('SNAPSHOT_COMPACT_MIN_BYTES', 1024 * 1024))
+# Seconds a restored countdown gets at least, so players have time to reconnect and act
+RESTORE_GRACE = float(os.getenv('SNAPSHOT_RESTORE_GRACE', 5))
+
+# Each record is (table ID, length) followed by that many bytes of a zlib-compressed pickle of
+# {'game_state', 'timer': {'phase', 'deadline'} or None}; an empty record removes the table.
+# Pickle (the file is only ever read by this server) restores thousands of tables in a fraction of a second.
+RECORD_HEADER = struct.Struct('>qI')
+
+# Table ID -> pickled record captured since the last write (None if the table was removed)
+pending = {}
+_pending_lock = threading.Lock()
+
+# Table ID -> its latest compressed record in the file, to rewrite it on compaction
+latest_records = {}
+_write_lock = threading.Lock()
+_file = None
+
+snapshot_counters = {
+    'captured': 0, 'written': 0, 'writes': 0, 'compactions': 0, 'file_bytes': 0,
+    'last_write_seconds': 0.0, 'restored': 0, 'restore_seconds': 0.0, 'skipped_records': 0,
+}
+
+def snapshot_path():
+    """SNAPSHOT_PATH, else a file per worker next to the SQLite database."""
+    return os.getenv('SNAPSHOT_PATH') or data_path(app, f'tables-{WORKER_INDEX}.snap')
+
+def encode_table(table_id, game_state):
+    from timer import table_timers
+    timer = table_timers.get(table_id)
+    return pickle.dumps({
+        'game_state': game_state,
+        'timer': {'phase': timer['phase'], 'deadline': game_state.get('timer_deadline')} if timer else None,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+def capture(table_id, game_state):
+    """Take a copy of a table's state as it is now; it reaches the file on the next write.
+
+    Runs wherever the table was just changed (when its broadcast is
+    flushed), so the copy is consistent; compression and I/O happen later
+    in the writer task.
+    """
+    try:
+        record = encode_table(table_id, game_state)
+    except (TypeError, AttributeError, pickle.PicklingError):
+        table_logger(logger, table_id).exception('Could not snapshot table')
+        return
+    with _pending_lock:
+        pending[table_id] = record
+        snapshot_counters['captured'] += 1
+
+def drop_snapshot(table_id):
+    """Record that the table is gone, so a restart does not bring it back."""
+    with _pending_lock:
+        pending[int(table_id)] = None
+
+def _open():
+    global _file
+    path = snapshot_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _file = open(path, 'ab')
+    snapshot_counters['file_bytes'] = _file.tell()
+
+def write_pending():
+    """Append the tables captured since the last write; return how many were written."""
+    with _pending_lock:
+        records = dict(pending)
+        pending.clear()
+    if not records:
+        return 0
+
+    with _write_lock:
+        started = time.perf_counter()
+        if _file is None:
+            _open()
+        chunks = []
+        for table_id, record in records.items():
+            if record is None:
+                compressed = b''
+                latest_records.pop(table_id, None)
+            else:
+                compressed = latest_records[table_id] = zlib.compress(record, 1)
+            chunks.append(RECORD_HEADER.pack(table_id, len(compressed)) + compressed)
+        data = b''.join(chunks)
+        _file.write(data)
+        _file.flush()
+        os.fsync(_file.fileno())
+        snapshot_counters['file_bytes'] += len(data)
+        snapshot_counters['written'] += len(records)
+        snapshot_counters['writes'] += 1
+
+        live_bytes = sum(len(record) + RECORD_HEADER.size for record in latest_records.values())
+        if snapshot_counters['file_bytes'] > max(COMPACT_MIN_BYTES, COMPACT_RATIO * live_bytes):
+            _compact()
+        snapshot_counters['last_write_seconds'] = time.perf_counter() - started
+    return len(records)
+
+def _compact():
+    """Replace the file with the latest record of each live table."""
+    global _file
+    path = snapshot_path()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for table_id, record in latest_records.items():
+            f.write(RECORD_HEADER.pack(table_id, len(record)) + record)
+        f.flush()
+        os.fsync(f.fileno())
+    if _file is not None:
+        _file.close()
+    os.replace(tmp_path, path)
+    _file = None
+    _open()
+    snapshot_counters['compactions'] += 1
+
+def read_snapshot(path):
+    """Latest compressed record of every table in the file, stopping at a torn tail."""
+    records = {}
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return records
+
+    # Only the headers are read here; superseded records are never decompressed
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        table_id, length = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + RECORD_HEADER.size + length
+        if end > len(data):
+            break
+        if length:
+            records[table_id] = data[offset + RECORD_HEADER.size:end]
+        else:
+            records.pop(table_id, None)
+        offset = end
+
+    if offset < len(data):
+        snapshot_counters['skipped_records'] += 1
+        logger.warning('Ignoring %d bytes of torn snapshot data at the end of %s', len(data) - offset, path)
+    return records
+
+def restore():
+    """Rebuild game_states from the snapshot file and re-arm each table's countdown."""
+    from timer import start_timer, PHASE_TIMERS
+    started = time.perf_counter()
+    records = read_snapshot(snapshot_path())
+
+    timers = []
+    for table_id, compressed in records.items():
+        log = table_logger(logger, table_id)
+        if not is_local(table_id):
+            log.warning('Snapshot of a table owned by another worker, skipping')
+            continue
+        try:
+            record = pickle.loads(zlib.decompress(compressed))
+            game_state = record['game_state']
+        except (zlib.error, pickle.UnpicklingError, EOFError, ValueError, KeyError):
+            log.exception('Corrupt snapshot, skipping')
+            continue
+        game_states[table_id] = game_state
+        latest_records[table_id] = compressed
+        if record.get('timer') and record['timer']['phase'] in PHASE_TIMERS:
+            timers.append((table_id, record['timer']))
+
+    # Countdowns restart from what was left of them, but no shorter than the grace period
+    now = scheduler.clock.time()
+    for table_id, timer in timers:
+        game_state = game_states[table_id]
+        game_state['timer'] = round(max((timer['deadline'] or now) - now, RESTORE_GRACE), 2)
+        start_timer(timer['phase'], table_id)
+
+    with _write_lock:
+        # Start from a compact file without any torn tail
+        _compact()
+    snapshot_counters['restored'] = len(latest_records)
+    snapshot_counters['restore_seconds'] = time.perf_counter() - started
+    if latest_records:
+        logger.info('Restored %d tables (%d countdowns) in %.3fs', len(latest_records), len(timers),
+                    snapshot_counters['restore_seconds'])
+
+def _run():
+    while True:
+        socketio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            write_pending()
+        except OSError:
+            logger.exception('Could not write snapshots')
+
+def start_snapshots():
+    """Restore the tables of the last run, then snapshot every table as it changes."""
+    if not SNAPSHOTS:
+        return
+    from broadcast import add_flush_hook
+    restore()
+    add_flush_hook(capture)
+    socketio.start_background_task(_run)
+    atexit.register(write_pending)
+
+def snapshot_stats():
+    with _pending_lock:
+        queued = len(pending)
+    return dict(snapshot_counters, pending=queued, tables=len(latest_records), path=snapshot_path())
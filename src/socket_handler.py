@@ -1,24 +1,73 @@
 from main import socketio, game_states
 from datetime import datetime
-from src.models.models import Player, Game, GamePlayer, ChatMessage
+from src.models.models import Player, Table, Game, GamePlayer
 from src.models import db
 from flask_socketio import emit, join_room, leave_room
-from helpers import find_suitable_table, process_betting_action, process_classification_action
-from card_utils import shuffle_deck, create_deck
-from timer import start_timer
+from flask import request, g
+from helpers import find_suitable_table, new_game_state, seat_player, apply_player_action, player_equity
+from card_utils import Deck, table_seed
+from broadcast import broadcast_game_state, send_snapshot, forget_table, register_seat, unregister_sid, flush_after
+from timer import start_timer, cancel_timer
+from shard_rpc import owned_by_table, notify_workers
+from player_cache import player_cache
+from rate_limit import rate_limited, rate_limiter
+from chat import post_chat_message, chat_history, forget_chat
+from snapshot import drop_snapshot
+from journal import journal
+from equity import parse_samples
+from scheduler import scheduler
+from log_config import get_logger, table_logger
+
+logger = get_logger('socket_handler')
 
 # SocketIO events
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection."""
-    print('Client connected')
+    logger.debug('Client connected')
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection."""
-    print('Client disconnected')
+    logger.debug('Client disconnected')
+    unregister_sid(request.sid)
+    player_cache.unbind(request.sid)
+    rate_limiter.forget_sid(request.sid)
+    notify_workers('disconnect', sid=request.sid)
+
+@socketio.on('clock_sync')
+def handle_clock_sync(data):
+    """Return the server clock so the client can render timer deadlines locally."""
+    return {
+        'client_time': (data or {}).get('client_time'),
+        'server_time': scheduler.clock.time()
+    }
+
+@socketio.on('resync_request')
+@rate_limited('resync_request')
+@owned_by_table()
+def handle_resync_request(data):
+    """Resend the full game state to a client that missed a delta."""
+    table_id = (data or {}).get('table_id')
+
+    if not table_id or int(table_id) not in game_states:
+        emit('error', {'message': 'Game not found'})
+        return
+
+    send_snapshot(table_id, game_states[int(table_id)], to=request.sid)
+
+def joining_table_id(data):
+    """The table a join_table event will seat its player at, so it can be routed to its owner."""
+    # Chips may have changed on another worker, and they pick the table
+    player = player_cache.refresh((data or {}).get('session_id'), request.sid)
+    if not player:
+        return None
+    return find_suitable_table(player.chips).id
 
 @socketio.on('join_table')
+@rate_limited('join_table')
+@owned_by_table(joining_table_id)
+@flush_after
 def handle_join_table(data):
     """Handle player joining a table."""
     session_id = data.get('session_id')
@@ -27,17 +76,19 @@ def handle_join_table(data):
         emit('error', {'message': 'Session ID is required'})
         return
     
-    player = Player.query.filter_by(session_id=session_id).first()
+    # The player is seated with the chips in their row, which another worker may have changed
+    player = player_cache.refresh(session_id, request.sid)
     
     if not player:
         emit('error', {'message': 'Player not found'})
         return
     
-    # Find or create a suitable table based on player's chips
-    suitable_table = find_suitable_table(player.chips)
+    # The table suited to the player's chips was found (or created) when routing the event
+    suitable_table = Table.query.get(g.table_id)
     
     # Join the table room
     join_room(f'table_{suitable_table.id}')
+    register_seat(suitable_table.id, player.id, request.sid)
     
     # Check if player is already at this table
     existing_game_player = GamePlayer.query.join(Game).filter(
@@ -46,8 +97,8 @@ def handle_join_table(data):
         Game.status == 'active'
     ).first()
     
-    # game_states == 0 if server restarted since game_states is session-based (non-DB)
-    if not existing_game_player or len(game_states) == 0:
+    # Tables come back from their snapshot after a restart; one that did not starts over
+    if not existing_game_player or suitable_table.id not in game_states:
         # Add player to the table
         active_game = Game.query.filter_by(table_id=suitable_table.id, status='active').first()
         
@@ -57,30 +108,10 @@ def handle_join_table(data):
             db.session.add(active_game)
             db.session.commit()
             
-            
-            game_states[suitable_table.id] = {
-                'game_id': active_game.id,
-                'players': [],
-                'state': 'waiting',
-                'deck': shuffle_deck(create_deck()),
-                'pot': 0,
-                'current_hand': None,
-                'timer': None,
-                'chat_enabled': True
-            }
-            
         # Initialize game state
         if suitable_table.id not in game_states:
-            game_states[suitable_table.id] = {
-                'game_id': active_game.id,
-                'players': [],
-                'state': 'waiting',
-                'deck': shuffle_deck(create_deck()),
-                'pot': 0,
-                'current_hand': None,
-                'timer': None,
-                'chat_enabled': True
-            }
+            game_states[suitable_table.id] = new_game_state(active_game.id, Deck(table_seed(suitable_table.id)))
+            journal.table_created(suitable_table.id, active_game.id, game_states[suitable_table.id]['deck'])
 
         
         # Find an available seat
@@ -103,24 +134,15 @@ def handle_join_table(data):
         db.session.add(game_player)
         db.session.commit()
         
-        # Update game state
-        game_state = game_states.get(suitable_table.id, {})
-        game_state['players'].append({
-            'id': player.id,
-            'username': player.username or f'Player {player.id}',
-            'chips': player.chips,
-            'seat': seat_position,
-            'status': 'active'
-        })
-        
-        # Check if we should start the game
-        if len(game_state['players']) >= 2 and game_state['state'] == 'waiting':
-            from game import moveGameStateToNext
-            moveGameStateToNext(game_state, suitable_table.id)
+        # Update game state, starting the game once two players are seated
+        username = player.username or f'Player {player.id}'
+        journal.player_joined(suitable_table.id, player.id, username, player.chips, seat_position)
+        seat_player(game_states[suitable_table.id], suitable_table.id, player.id, username, player.chips, seat_position)
     
-    # Send updated game state to all players at the table
-    # NOTE: game_states here can be empty if the server restarted
-    emit('game_state_update', game_states.get(suitable_table.id, {}), room=f'table_{suitable_table.id}')
+    # Send the change to the players at the table and the full state to the new one
+    broadcast_game_state(suitable_table.id, game_states.get(suitable_table.id, {}))
+    send_snapshot(suitable_table.id, game_states.get(suitable_table.id, {}), to=request.sid)
+    emit('chat_history', {'messages': chat_history(suitable_table.id)})
     
     # Notify other players
     emit('player_joined', {
@@ -136,6 +158,9 @@ def handle_join_table(data):
     }
 
 @socketio.on('leave_table')
+@rate_limited('leave_table')
+@owned_by_table()
+@flush_after
 def handle_leave_table(data):
     """Handle player leaving a table."""
     session_id = data.get('session_id')
@@ -145,7 +170,7 @@ def handle_leave_table(data):
         emit('error', {'message': 'Session ID and table ID are required'})
         return
     
-    player = Player.query.filter_by(session_id=session_id).first()
+    player = player_cache.lookup(session_id, request.sid)
     
     if not player:
         emit('error', {'message': 'Player not found'})
@@ -160,12 +185,15 @@ def handle_leave_table(data):
     
     if game_player:
         # Update player's chips
-        player.chips = game_player.final_chips or game_player.initial_chips
+        player_row = Player.query.get(player.id)
+        player_row.chips = game_player.final_chips or game_player.initial_chips
         db.session.commit()
+        player_cache.update(player_row)
         
         # Update game state
         game_state = game_states.get(int(table_id), {})
         if game_state:
+            journal.player_left(table_id, player.id)
             game_state['players'] = [p for p in game_state['players'] if p['id'] != player.id]
             
             # If no players left, end the game
@@ -178,12 +206,18 @@ def handle_leave_table(data):
                     
                     # Remove game state
                     game_states.pop(int(table_id), None)
+                    cancel_timer(int(table_id))
+                    forget_table(table_id)
+                    forget_chat(table_id)
+                    rate_limiter.forget_table(table_id)
+                    drop_snapshot(table_id)
             else:
                 # Send updated game state to remaining players
-                emit('game_state_update', game_state, room=f'table_{table_id}')
+                broadcast_game_state(table_id, game_state)
     
     # Leave the table room
     leave_room(f'table_{table_id}')
+    unregister_sid(request.sid)
     
     # Notify other players
     emit('player_left', {
@@ -194,6 +228,10 @@ def handle_leave_table(data):
     return {'success': True}
 
 @socketio.on('player_action')
+@rate_limited('player_action')
+@owned_by_table()
+@rate_limited('player_action', scope='table')
+@flush_after
 def handle_player_action(data):
     """Handle player game actions (kill/kick, check/bet/fold)."""
     session_id = data.get('session_id')
@@ -201,15 +239,14 @@ def handle_player_action(data):
     action_type = data.get('action_type')
     action_data = data.get('action_data', {})
 
-    player_action_string = 'Player ' + session_id + ' made action ' + action_type + ' with ' + str(action_data)
-    print(player_action_string)
+    table_logger(logger, table_id).debug('Player %s made action %s with %s', session_id, action_type, action_data)
 
     
     if not session_id or not table_id or not action_type:
         emit('error', {'message': 'Session ID, table ID, and action type are required'})
         return
     
-    player = Player.query.filter_by(session_id=session_id).first()
+    player = player_cache.lookup(session_id, request.sid)
     
     if not player:
         emit('error', {'message': 'Player not found'})
@@ -221,45 +258,60 @@ def handle_player_action(data):
         emit('error', {'message': 'Game not found'})
         return
     
-    # Fix gamestate. This is important for debug mode.
-    if action_type == 'kill':
-        game_state['state'] = 'choose_trash'
-    elif action_type == 'kick':
-        game_state['state'] = 'choose_tango'
-    
-    # Fix from debug states
-    if action_type == 'bet' and game_state['state'] == 'turn_draw':
-        game_state['state'] = 'post_turn_betting'
-        game_state['current_player_index'] = 0
-
-    # Fix from debug states
-    if action_type == 'bet' and game_state['state'] == 'board_reveal':
-        game_state['state'] = 'final_betting'
-        game_state['current_player_index'] = 0
-
-    # Process action based on game state and action type
-    if game_state['state'] == 'choose_trash':
-        if action_type in ['kill']:
-            process_classification_action(player.id, int(table_id), action_type, action_data)
-    elif game_state['state'] == 'choose_tango':
-        if action_type in ['kick']:
-            process_classification_action(player.id, int(table_id), action_type, action_data)
-    elif game_state['state'] in ['ante']:
-        if action_type in ['bet']:
-            process_betting_action(player.id, int(table_id), action_type, action_data)
-    elif game_state['state'] in ['pre_kick_betting', 'post_turn_betting', 'final_betting']:
-        if action_type in ['check', 'bet', 'fold']:
-            process_betting_action(player.id, int(table_id), action_type, action_data)
-    else:
+    # Recorded before it is applied, so a replay applies the same inputs in the same order
+    journal.player_action(table_id, player.id, action_type, action_data)
+    if not apply_player_action(game_state, int(table_id), player.id, action_type, action_data):
         emit('error', {'message': f'Action {action_type} not allowed in current game state'})
         return
     
     # Send updated game state to all players at the table
-    emit('game_state_update', game_states.get(int(table_id), {}), room=f'table_{table_id}')
+    broadcast_game_state(table_id, game_states.get(int(table_id), {}))
     
     return {'success': True}
 
+@socketio.on('equity_request')
+@rate_limited('equity_request')
+@owned_by_table()
+@rate_limited('equity_request', scope='table')
+def handle_equity_request(data):
+    """Send a player the win/tie probabilities of their kill/kick choices."""
+    session_id = data.get('session_id')
+    table_id = data.get('table_id')
+
+    if not session_id or not table_id:
+        emit('error', {'message': 'Session ID and table ID are required'})
+        return
+
+    player = player_cache.lookup(session_id, request.sid)
+
+    if not player:
+        emit('error', {'message': 'Player not found'})
+        return
+
+    game_state = game_states.get(int(table_id), {})
+
+    if not game_state:
+        emit('error', {'message': 'Game not found'})
+        return
+
+    try:
+        choices = player_equity(game_state, player.id, parse_samples(data.get('samples')))
+    except ValueError as e:
+        emit('error', {'message': f'Invalid equity request: {e}'})
+        return
+
+    if choices is None:
+        emit('error', {'message': 'No cards to evaluate'})
+        return
+
+    emit('equity_result', {'choices': choices})
+
+    return {'success': True}
+
 @socketio.on('chat_message')
+@rate_limited('chat_message')
+@owned_by_table()
+@rate_limited('chat_message', scope='table')
 def handle_chat_message(data):
     """Handle chat messages."""
     session_id = data.get('session_id')
@@ -270,7 +322,7 @@ def handle_chat_message(data):
         emit('error', {'message': 'Session ID, table ID, and message are required'})
         return
     
-    player = Player.query.filter_by(session_id=session_id).first()
+    player = player_cache.lookup(session_id, request.sid)
     
     if not player:
         emit('error', {'message': 'Player not found'})
@@ -287,23 +339,8 @@ def handle_chat_message(data):
         emit('error', {'message': 'Chat is currently disabled'})
         return
     
-    # Save chat message
-    game = Game.query.get(game_state['game_id'])
-    if game:
-        chat_message = ChatMessage(
-            game_id=game.id,
-            player_id=player.id,
-            message=message
-        )
-        db.session.add(chat_message)
-        db.session.commit()
-    
-    # Broadcast message to all players at the table
-    emit('chat_message', {
-        'player_id': player.id,
-        'username': player.username or f'Player {player.id}',
-        'message': message,
-        'timestamp': datetime.utcnow().isoformat()
-    }, room=f'table_{table_id}')
+    # Broadcast from memory; the DB write happens later in a batch
+    chat_message = post_chat_message(table_id, game_state['game_id'], player, message)
+    emit('chat_message', chat_message, room=f'table_{table_id}')
     
     return {'success': True}
\ No newline at end of file
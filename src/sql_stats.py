@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import flask
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from main import socketio
+from log_config import get_logger
+
+logger = get_logger('sql_stats')
+
+SQL_STATS = os.getenv('SQL_STATS', 'true').lower() == 'true'
+# Seconds between summaries in the log (0 turns them off)
+LOG_INTERVAL = float(os.getenv('SQL_STATS_LOG_INTERVAL', 300))
+# An identical statement run this many times in one unit of work is flagged as a likely N+1
+# (batch units, which repeat statements per item by design, are not checked)
+REPEAT_THRESHOLD = int(os.getenv('SQL_REPEAT_THRESHOLD', 3))
+
+# Unit name -> counters, over the units that ran any SQL
+unit_stats = {}
+_stats_lock = threading.Lock()
+
+# Explicit unit of work and pending commit of the current thread
+_local = threading.local()
+
+class UnitOfWork:
+    """The statements one socket event, route or timer phase has run so far."""
+
+    __slots__ = ('name', 'statements', 'seen', 'check_repeats')
+
+    def __init__(self, name, check_repeats=True):
+        self.name = name
+        self.check_repeats = check_repeats
+        self.statements = 0
+        # Statement text -> times run
+        self.seen = Counter()
+
+def _counters(name):
+    stats = unit_stats.get(name)
+    if stats is None:
+        stats = unit_stats[name] = {
+            'units': 0, 'statements': 0, 'statement_seconds': 0.0, 'max_statement_seconds': 0.0,
+            'max_statements_per_unit': 0, 'commits': 0, 'commit_seconds': 0.0, 'max_commit_seconds': 0.0,
+            'repeated': Counter(),
+        }
+    return stats
+
+@contextmanager
+def sql_unit(name, check_repeats=True):
+    """Attribute the statements run inside the block to a unit of work called name.
+
+    Pass check_repeats=False for batch writes, where running one statement
+    per item is the point rather than an N+1.
+    """
+    previous = getattr(_local, 'unit', None)
+    _local.unit = UnitOfWork(name, check_repeats)
+    try:
+        yield _local.unit
+    finally:
+        _local.unit = previous
+
+def current_unit():
+    """The explicit unit of this thread, else the one of the socket event or HTTP request, if any."""
+    unit = getattr(_local, 'unit', None)
+    if unit is not None:
+        return unit
+    if not flask.has_request_context():
+        return None
+
+    request = flask.request._get_current_object()
+    unit = getattr(request, 'sql_unit', None)
+    if unit is None:
+        # Flask-SocketIO sets request.event for socket event handlers
+        if getattr(request, 'event', None):
+            name = f"event:{request.event['message']}"
+        else:
+            name = f'route:{request.endpoint}'
+        unit = request.sql_unit = UnitOfWork(name)
+    return unit
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('sql_stats_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['sql_stats_started'].pop()
+    elapsed = time.perf_counter() - started
+    unit = current_unit()
+
+    flagged = False
+    with _stats_lock:
+        stats = _counters(unit.name if unit else 'other')
+        stats['statements'] += 1
+        stats['statement_seconds'] += elapsed
+        stats['max_statement_seconds'] = max(stats['max_statement_seconds'], elapsed)
+        if unit is None:
+            return
+        unit.statements += 1
+        if unit.statements == 1:
+            stats['units'] += 1
+        stats['max_statements_per_unit'] = max(stats['max_statements_per_unit'], unit.statements)
+        if not unit.check_repeats:
+            return
+        unit.seen[statement] += 1
+        if unit.seen[statement] == REPEAT_THRESHOLD:
+            stats['repeated'][statement] += 1
+            flagged = stats['repeated'][statement] == 1
+    # Warn the first time a unit name repeats a given statement
+    if flagged:
+        logger.warning('%s ran the same statement %d times in one unit of work: %s',
+                       unit.name, REPEAT_THRESHOLD, ' '.join(statement.split()))
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('sql_stats_started'):
+        context.connection.info['sql_stats_started'].pop()
+
+def _before_commit(conn):
+    _local.commit_started = time.perf_counter()
+
+def _after_commit(session):
+    started = getattr(_local, 'commit_started', None)
+    if started is None:
+        return
+    _local.commit_started = None
+    elapsed = time.perf_counter() - started
+    unit = current_unit()
+    with _stats_lock:
+        stats = _counters(unit.name if unit else 'other')
+        stats['commits'] += 1
+        stats['commit_seconds'] += elapsed
+        stats['max_commit_seconds'] = max(stats['max_commit_seconds'], elapsed)
+
+def sql_stats():
+    with _stats_lock:
+        return {
+            'repeat_threshold': REPEAT_THRESHOLD,
+            'units': {
+                name: dict(stats, repeated=[
+                    {'statement': ' '.join(statement.split()), 'units': count}
+                    for statement, count in stats['repeated'].most_common()
+                ])
+                for name, stats in sorted(unit_stats.items(), key=lambda item: -item[1]['statements'])
+            },
+        }
+
+def _summary_lines(previous):
+    """One line per unit name with statements since the last summary, busiest first."""
+    with _stats_lock:
+        current = {name: (stats['units'], stats['statements'], stats['statement_seconds'],
+                          sum(stats['repeated'].values())) for name, stats in unit_stats.items()}
+    lines = []
+    for name, (units, statements, seconds, repeated) in current.items():
+        before = previous.get(name, (0, 0, 0.0, 0))
+        statements -= before[1]
+        if statements:
+            units -= before[0]
+            per_unit = f' in {units} units ({statements / units:.1f}/unit)' if units else ''
+            lines.append((statements, f'{name}: {statements} statements{per_unit}, '
+                                      f'{seconds - before[2]:.3f}s, {repeated - before[3]} repeated'))
+    return current, [line for _, line in sorted(lines, reverse=True)]
+
+def _log_summaries():
+    previous = {}
+    while True:
+        socketio.sleep(LOG_INTERVAL)
+        previous, lines = _summary_lines(previous)
+        if lines:
+            logger.info('SQL in the last %gs:\n  %s', LOG_INTERVAL, '\n  '.join(lines))
+
+def start_sql_stats():
+    """Count every statement and commit against the unit of work that ran it."""
+    if not SQL_STATS:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    event.listen(Engine, 'commit', _before_commit)
+    event.listen(Session, 'after_commit', _after_commit)
+    if LOG_INTERVAL > 0:
+        socketio.start_background_task(_log_summaries)
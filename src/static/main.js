@@ -178,16 +178,22 @@ function init() {
     // Socket Event Listeners
     socket.on('connect', () => {
         console.log('Connected to server');
+        syncClock();
     });
 
     socket.on('game_state_update', handleGameStateUpdate);
+    socket.on('game_state_delta', handleGameStateDelta);
+    socket.on('private_state', handlePrivateState);
     socket.on('player_joined', handlePlayerJoined);
     socket.on('player_left', handlePlayerLeft);
     socket.on('game_started', handleGameStarted);
     socket.on('timer_update', handleTimerUpdate);
+    socket.on('timer_deadline', handleTimerDeadline);
     socket.on('chat_message', handleChatMessage);
+    socket.on('chat_history', handleChatHistory);
     socket.on('hand_result', handleHandResult);
     socket.on('error', handleError);
+    socket.on('rate_limited', handleRateLimited);
 }
 
 // API Functions
@@ -305,12 +311,24 @@ function handleJoinTableResponse(response) {
     }
 }
 
+// Last full server state and its version; deltas are applied on top of it
+let serverState = null;
+let stateVersion = null;
+
+// Hidden fields of our own seat (cards, decisions), sent only to us
+let privateState = null;
+
 function handleGameStateUpdate(state) {
     console.log('Game state update:', state);
 
+    if (state.state_version !== undefined) {
+        serverState = state;
+        stateVersion = state.state_version;
+    }
+
     // Update game state
     gameState.state = state.state;
-    gameState.players = state.players || [];
+    gameState.players = withPrivateState(state.players || []);
     gameState.pot = state.pot || 0;
     gameState.timer = state.timer;
     gameState.chatEnabled = state.chat_enabled !== false;
@@ -319,10 +337,89 @@ function handleGameStateUpdate(state) {
     if (state.community_cards) {
         gameState.communityCards = state.community_cards;
     }
+    if (state.timer_deadline && state.timer_deadline !== currentDeadline) {
+        handleTimerDeadline({ deadline: state.timer_deadline });
+    }
 
     updateUI(gameState);
 }
 
+function handleGameStateDelta(delta) {
+    // The full snapshot sent on join has not arrived yet
+    if (stateVersion === null) {
+        return;
+    }
+    // Already covered by a newer snapshot
+    if (delta.version <= stateVersion) {
+        return;
+    }
+    if (delta.base_version !== stateVersion) {
+        requestResync();
+        return;
+    }
+
+    try {
+        applyPatch(serverState, delta.ops);
+    } catch (error) {
+        console.error('Failed to apply game state delta:', error);
+        requestResync();
+        return;
+    }
+    serverState.state_version = delta.version;
+    handleGameStateUpdate(serverState);
+}
+
+function handlePrivateState(data) {
+    privateState = data;
+    if (serverState) {
+        handleGameStateUpdate(serverState);
+    }
+}
+
+// Merge our private overlay into our own seat, leaving the server state untouched
+function withPrivateState(players) {
+    if (!privateState) {
+        return players;
+    }
+    return players.map(p => {
+        if (p.id !== privateState.player_id) {
+            return p;
+        }
+        const merged = Object.assign({}, p);
+        ['cards', 'turn_card', 'decisions', 'final_hand', 'hand_strength'].forEach(field => {
+            if (privateState[field] !== undefined) {
+                merged[field] = privateState[field];
+            }
+        });
+        return merged;
+    });
+}
+
+function requestResync() {
+    stateVersion = null;
+    if (gameState.tableId) {
+        socket.emit('resync_request', { table_id: gameState.tableId });
+    }
+}
+
+// Apply JSON-patch style add/remove/replace operations in place
+function applyPatch(target, ops) {
+    for (const op of ops) {
+        const keys = op.path.split('/').slice(1)
+            .map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+        const last = keys.pop();
+        let parent = target;
+        for (const key of keys) {
+            parent = parent[key];
+        }
+        if (op.op === 'remove') {
+            delete parent[last];
+        } else {
+            parent[last] = op.value;
+        }
+    }
+}
+
 function handlePlayerJoined(playerData) {
     console.log('Player joined:', playerData);
 
@@ -347,14 +444,40 @@ function handleGameStarted() {
 let displayedTime = 0;
 let lastUpdateTime = Date.now();
 let timerInterval;
+let currentDeadline = null;
+
+// Server clock minus local clock, in seconds
+let clockOffset = 0;
+
+function syncClock() {
+    const sentAt = Date.now() / 1000;
+    socket.emit('clock_sync', { client_time: sentAt }, (response) => {
+        if (!response) {
+            return;
+        }
+        const receivedAt = Date.now() / 1000;
+        // Assume the reply took half the round trip
+        clockOffset = response.server_time - (sentAt + receivedAt) / 2;
+    });
+}
+
+function handleTimerDeadline(data) {
+    currentDeadline = data.deadline;
+    const serverNow = Date.now() / 1000 + clockOffset;
+    startCountdown(Math.max(0, data.deadline - serverNow));
+}
 
 function handleTimerUpdate(data) {
     console.log('Timer update:', data);
+    startCountdown(data.timer);
+}
+
+function startCountdown(seconds) {
     // Display it incase it is hidden (value 0)
     timerElement.style.display = 'block';
 
     // Record the server time and timestamp of update
-    displayedTime = data.timer;
+    displayedTime = seconds;
     lastUpdateTime = Date.now();
 
     // Clear old interval if any
@@ -390,6 +513,11 @@ function handleChatMessage(message) {
     addChatMessage(message);
 }
 
+function handleChatHistory(data) {
+    // Messages sent before we joined the table
+    (data.messages || []).forEach(addChatMessage);
+}
+
 function handleHandResult(result) {
     console.log('Hand result:', result);
 
@@ -422,6 +550,11 @@ function handleError(error) {
     alert(error.message || 'An error occurred');
 }
 
+function handleRateLimited(data) {
+    // The server dropped an event we sent too fast; it is not worth an alert
+    console.warn(`Sending ${data.event} too fast, retry in ${data.retry_after}s`);
+}
+
 // Game Actions
 function selectCard(cardIndex) {
     gameState.selectedCard = cardIndex;
@@ -679,16 +812,16 @@ function updatePlayers() {
         }
 
 
-        if (p.cards) {
-            // Add player cards
-            p.cards.forEach((card, index) => {
+        if (p.card_count) {
+            // Add player cards; opponents' cards are never sent, only their count
+            for (let i = 0; i < p.card_count; i++) {
                 const cardElement = createBackFacingCardElement();
 
                 playerCardsElement.appendChild(cardElement);
-            });
+            }
 
             // Add turn card if available
-            if (p.turn_card) {
+            if (p.has_turn_card) {
                 const turnCard = createBackFacingCardElement();
                 playerCardsElement.appendChild(turnCard);
             }
@@ -797,7 +930,7 @@ function updateControls() {
         document.getElementById('bet-btn').onclick = placeBet;
     }
     if (gameState.state === 'choose_trash') {
-        if (currentPlayer.decisions.kill == null) {
+        if (currentPlayer.decisions?.kill == null) {
             cardActionsTrash.classList.remove('hidden');
         }
 
@@ -815,7 +948,7 @@ function updateControls() {
             processChooseTrash(player.sessionId, 2);
         }, { once: true });
     } else if (gameState.state === 'choose_tango') {
-        if (currentPlayer.decisions.kick == null) {
+        if (currentPlayer.decisions?.kick == null) {
             cardActionsTango.classList.remove('hidden');
         }
 
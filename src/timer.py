@@ -1,131 +1,137 @@
 import os
-from main import game_states, socketio, app, timer_config
-from card_utils import deal_cards, card_to_string, cards_to_string, shuffle_deck, create_deck
-from src.models.models import Table, Game, GamePlayer, Hand, HandPlayer
-from src.models import db
+from main import game_states, socketio
+from broadcast import broadcast_game_state
+from log_config import get_logger, table_logger
+from scheduler import scheduler
+from sql_stats import sql_unit
+from journal import journal
+
+logger = get_logger('timer')
+
+# Per-tick timer_update broadcasts, kept for clients that do not handle timer_deadline
+TICK_UPDATES = os.getenv('TIMER_TICK_UPDATES', 'false').lower() == 'true'
+
+# Table ID -> the table's live countdown: {'phase', 'state', 'generation', 'handle'}
+table_timers = {}
+# Table ID -> generation of the newest countdown; older countdowns stop on their next step
+timer_generations = {}
 
 def start_timer(phase, table_id):
     timer_disabled = os.getenv('DEBUG_DISABLE_TIMER', 'false').lower() == 'true'
 
     if timer_disabled:
-        print('Timer is disabled. Please continue the game using manual console commands.')
+        logger.info('Timer is disabled. Please continue the game using manual console commands.')
         return
-    print('Starting timer ' + phase)
-
-    if phase == 'card_draw':
-        socketio.start_background_task(countdown_to_start, table_id)
-    elif phase == 'choose_trash' or phase == 'choose_tango':
-        socketio.start_background_task(classification_timer, table_id)
-    elif phase == 'betting':
-        socketio.start_background_task(betting_timer, table_id)
-    elif phase == 'turn_draw':
-        socketio.start_background_task(turn_draw_timer, table_id)
-    elif phase == 'board_reveal':
-        socketio.start_background_task(board_reveal_timer, table_id)
-    elif phase == 'showdown':
-        socketio.start_background_task(showdown_timer, table_id)
-    elif phase == 'end':
-        socketio.start_background_task(end_timer, table_id)
-    elif phase == 'next_hand':
-        socketio.start_background_task(next_hand_timer, table_id)
-
-def countdown_to_start(table_id):
-    """Countdown to start the game, starting with choose_trash."""
     table_id = int(table_id)
+    log = table_logger(logger, table_id)
+    log.debug('Starting timer %s', phase)
+
     game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] != 'card_draw':
+    if phase not in PHASE_TIMERS or not game_state or game_state['state'] not in PHASE_TIMERS[phase]['states']:
+        log.warning('Invalid game state.')
         return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(0.5)
-        game_state['timer'] = round(game_state['timer'] - 0.5, 2)
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
-    # Start the game
-    from helpers import start_game
-    start_game(table_id)
 
+    # A table only ever has one live countdown
+    cancel_timer(table_id)
+    generation = timer_generations.get(table_id, 0) + 1
+    timer_generations[table_id] = generation
+    table_timers[table_id] = {'phase': phase, 'state': game_state['state'], 'generation': generation, 'handle': None}
 
-def turn_draw_timer(table_id):
-    table_id = int(table_id)
+    # Clients count down locally from the deadline
+    duration = max(game_state['timer'] or 0, 0)
+    game_state['timer_deadline'] = scheduler.clock.time() + duration
+    socketio.emit('timer_deadline', {
+        'state': game_state['state'],
+        'phase': phase,
+        'duration': duration,
+        'deadline': game_state['timer_deadline'],
+        'server_time': scheduler.clock.time(),
+    }, room=f'table_{table_id}')
+
+    if TICK_UPDATES:
+        delay = PHASE_TIMERS[phase]['interval'] if duration > 0 else 0
+    else:
+        delay = duration
+    schedule_countdown(delay, phase, table_id, game_state['state'], generation)
+
+def schedule_countdown(delay, phase, table_id, phase_state, generation):
+    table_timers[table_id]['handle'] = scheduler.schedule(
+        delay, countdown_tick, phase, table_id, phase_state, generation
+    )
+
+def cancel_timer(table_id):
+    """Cancel the table's live countdown, if any."""
+    timer = table_timers.pop(table_id, None)
+    if timer and timer['handle']:
+        timer['handle'].cancel()
+
+def live_timers(table_id=None):
+    """List the live countdown of every table, or of one table."""
+    timers = []
+    for timer_table_id, timer in list(table_timers.items()):
+        if table_id is not None and timer_table_id != table_id:
+            continue
+        game_state = game_states.get(timer_table_id, {})
+        timers.append({
+            'table_id': timer_table_id,
+            'phase': timer['phase'],
+            'state': timer['state'],
+            'generation': timer['generation'],
+            'timer': game_state.get('timer'),
+            'next_step_in': timer['handle'].remaining() if timer['handle'] else None,
+        })
+    return timers
+
+def countdown_tick(phase, table_id, phase_state, generation):
+    """One step of a phase countdown (the whole countdown without TICK_UPDATES), run by the scheduler."""
     game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] != 'turn_draw':
-        print('Invalid game state.')
+
+    # Superseded by a newer countdown for this table
+    if not game_state or timer_generations.get(table_id) != generation:
         return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(0.5)
-        game_state['timer'] = round(game_state['timer'] - 0.5, 2)
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
-    from game import moveGameStateToNext
-    moveGameStateToNext(game_state, table_id)
 
-    
-def end_timer(table_id):
-    table_id = int(table_id)
-    game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] != 'end':
-        print('Invalid game state.')
+    # Betting countdowns stop as soon as the round moves on
+    if phase == 'betting' and game_state['state'] != phase_state:
+        table_timers.pop(table_id, None)
         return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(0.5)
-        game_state['timer'] = round(game_state['timer'] - 0.5, 2)
+
+    interval = PHASE_TIMERS[phase]['interval']
+    if not TICK_UPDATES:
+        game_state['timer'] = 0
+    elif game_state['timer'] > 0:
+        game_state['timer'] = round(game_state['timer'] - interval, 2)
         socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
-    from game import moveGameStateToNext
-    moveGameStateToNext(game_state, table_id)
 
+    if game_state['timer'] > 0:
+        schedule_countdown(interval, phase, table_id, phase_state, generation)
+    else:
+        table_timers.pop(table_id, None)
+        journal.timer_expired(table_id, phase, phase_state)
+        with sql_unit(f'timer:{phase_state}'):
+            PHASE_TIMERS[phase]['timeout'](table_id, phase_state)
 
-def showdown_timer(table_id):
-    table_id = int(table_id)
-    game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] != 'showdown':
-        print('Invalid game state.')
-        return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(0.5)
-        game_state['timer'] = round(game_state['timer'] - 0.5, 2)
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
-    from game import moveGameStateToNext
-    moveGameStateToNext(game_state, table_id)
+def card_draw_timeout(table_id, phase_state):
+    """Start the game, starting with choose_trash."""
+    from helpers import start_game
+    start_game(table_id)
 
-def board_reveal_timer(table_id):
-    table_id = int(table_id)
+def advance_timeout(table_id, phase_state):
+    """Move a timed phase with no player input on to the next state."""
     game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] != 'board_reveal':
-        print('Invalid game state.')
+
+    if not game_state:
         return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(0.5)
-        game_state['timer'] = round(game_state['timer'] - 0.5, 2)
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
+
     from game import moveGameStateToNext
     moveGameStateToNext(game_state, table_id)
 
-def classification_timer(table_id):
-    """Timer for classification phase."""
-    table_id = int(table_id)
+def classification_timeout(table_id, phase_state):
+    """Auto-decide kill/kick for players who ran out of time."""
     game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] not in ['choose_trash', 'choose_tango']:
+
+    if not game_state:
         return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(1)
-        game_state['timer'] -= 1
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
+
     # Auto-decide for players who haven't made all decisions
     if game_state['state'] in ['choose_trash']:
         for player in game_state['players']:
@@ -139,18 +145,8 @@ def classification_timer(table_id):
                 if player['decisions']['kill'] is None and remaining_indices:
                     player['decisions']['kill'] = remaining_indices.pop(0)
                 
-                # Update database
-                with app.app_context():
-                    hand = Hand.query.get(game_state['current_hand'])
-                    if hand:
-                        hand_player = HandPlayer.query.filter_by(
-                            hand_id=hand.id,
-                            player_id=player['id']
-                        ).first()
-                        
-                        if hand_player:
-                            from helpers import process_kill_card
-                            process_kill_card(player, hand_player)
+                from helpers import process_kill_card
+                process_kill_card(game_state, player)
     elif game_state['state'] in ['choose_tango']:
         for player in game_state['players']:
             if None in [player['decisions']['kick']]:
@@ -163,20 +159,10 @@ def classification_timer(table_id):
                 if player['decisions']['kick'] is None and remaining_indices:
                     player['decisions']['kick'] = remaining_indices.pop(0)
                 
-                # Update database
-                with app.app_context():
-                    hand = Hand.query.get(game_state['current_hand'])
-                    if hand:
-                        hand_player = HandPlayer.query.filter_by(
-                            hand_id=hand.id,
-                            player_id=player['id']
-                        ).first()
-                        
-                        if hand_player:
-                            from helpers import process_kick_card
-                            process_kick_card(player, hand_player)
+                from helpers import process_kick_card
+                process_kick_card(game_state, player)
     else:
-        print('Invalid game state: ' + game_state['state'])
+        table_logger(logger, table_id).warning('Invalid game state: %s', game_state['state'])
         return
     
 
@@ -184,24 +170,16 @@ def classification_timer(table_id):
     moveGameStateToNext(game_state, table_id)
     
     # Send updated game state to all players
-    socketio.emit('game_state_update', game_state, room=f'table_{table_id}')
+    broadcast_game_state(table_id, game_state)
 
 
-def betting_timer(table_id):
-    """Timer for betting phases."""
-    table_id = int(table_id)
+def betting_timeout(table_id, current_state):
+    """Check or fold for the current player when the betting timer runs out."""
     game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] not in ['pre_kick_betting', 'post_turn_betting', 'final_betting']:
+
+    if not game_state:
         return
-    
-    current_state = game_state['state']
-    
-    while game_state['timer'] > 0 and game_state['state'] == current_state:
-        socketio.sleep(1)
-        game_state['timer'] -= 1
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
+
     # If still in the same state, auto-action for current player
     if game_state['state'] == current_state:
         current_player = game_state['players'][game_state['current_player_index']]
@@ -225,25 +203,20 @@ def betting_timer(table_id):
     # TODO: move gamestate here if all players betted?
     
     # Send updated game state to all players
-    socketio.emit('game_state_update', game_state, room=f'table_{table_id}')
+    broadcast_game_state(table_id, game_state)
 
 
 
-def next_hand_timer(table_id):
-    """Timer for starting the next hand."""
-    table_id = int(table_id)
+def next_hand_timeout(table_id, phase_state):
+    """Reset the table and start the next hand."""
     game_state = game_states.get(table_id)
-    
-    if not game_state or game_state['state'] != 'next_hand':
+
+    if not game_state:
         return
-    
-    while game_state['timer'] > 0:
-        socketio.sleep(1)
-        game_state['timer'] -= 1
-        socketio.emit('timer_update', {'timer': game_state['timer']}, room=f'table_{table_id}')
-    
+
     # Reset for next hand
-    game_state['deck'] = shuffle_deck(create_deck())
+    game_state['deck_seed'] = game_state['deck'].shuffle()
+    journal.deck_shuffled(table_id, game_state['deck_seed'])
     
     # Reset player statuses
     for player in game_state['players']:
@@ -254,6 +227,10 @@ def next_hand_timer(table_id):
             del player['decisions']
         if 'turn_card' in player:
             del player['turn_card']
+        if 'killed_card' in player:
+            del player['killed_card']
+        if 'kicked_card' in player:
+            del player['kicked_card']
         if 'final_hand' in player:
             del player['final_hand']
         if 'hand_strength' in player:
@@ -269,4 +246,17 @@ def next_hand_timer(table_id):
     
     # Start new hand
     from helpers import start_game
-    start_game(table_id)
\ No newline at end of file
+    start_game(table_id)
+
+
+PHASE_TIMERS = {
+    'card_draw': {'states': ['card_draw'], 'interval': 0.5, 'timeout': card_draw_timeout},
+    'choose_trash': {'states': ['choose_trash', 'choose_tango'], 'interval': 1, 'timeout': classification_timeout},
+    'choose_tango': {'states': ['choose_trash', 'choose_tango'], 'interval': 1, 'timeout': classification_timeout},
+    'betting': {'states': ['pre_kick_betting', 'post_turn_betting', 'final_betting'], 'interval': 1, 'timeout': betting_timeout},
+    'turn_draw': {'states': ['turn_draw'], 'interval': 0.5, 'timeout': advance_timeout},
+    'board_reveal': {'states': ['board_reveal'], 'interval': 0.5, 'timeout': advance_timeout},
+    'showdown': {'states': ['showdown'], 'interval': 0.5, 'timeout': advance_timeout},
+    'end': {'states': ['end'], 'interval': 0.5, 'timeout': advance_timeout},
+    'next_hand': {'states': ['next_hand'], 'interval': 1, 'timeout': next_hand_timeout},
+}
@@ -0,0 +1,121 @@
+import atexit
+import threading
+import time
+from collections import deque
+from main import app, socketio
+from log_config import get_logger
+from sql_stats import sql_unit
+
+logger = get_logger('write_behind')
+
+class BatchWriter:
+    """Queue items and persist them in batches from one background task.
+
+    A batch is written once max_batch items are waiting or the oldest has
+    waited max_delay seconds, so DB work grows with the number of batches
+    rather than items. write_batch(items) runs inside an app context and
+    should commit once. Whatever is still queued is written at exit.
+
+    submit() never waits: it runs on game transitions and timer callbacks.
+    The queue holds at most max_queue items, and items submitted while it
+    is full are dropped and counted. A batch that fails to write is tried
+    again up to retries times, retry_delay seconds apart, before its items
+    are dropped. stats() reports both along with the queue's high-water mark.
+    """
+
+    def __init__(self, name, write_batch, max_batch=100, max_delay=0.5, max_queue=10_000,
+                 retries=1, retry_delay=0.5):
+        self.name = name
+        self.write_batch = write_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = deque()
+        self._ready = threading.Condition()
+        # Only one batch is written at a time, whether by the task or flush()
+        self._write_lock = threading.Lock()
+        self._task = None
+        self.stats_counters = {
+            'enqueued': 0, 'written': 0, 'batches': 0, 'retried': 0, 'failed': 0,
+            'high_water': 0, 'dropped': 0, 'last_batch_seconds': 0.0,
+        }
+        atexit.register(self.flush)
+
+    def submit(self, item):
+        with self._ready:
+            if self._task is None:
+                self._task = socketio.start_background_task(self._run)
+            if len(self._queue) >= self.max_queue:
+                # Shed load rather than grow without bound or make the game wait on the database
+                if self.stats_counters['dropped'] % 1000 == 0:
+                    logger.warning('%s: queue full (%d items), dropping new items (%d so far)',
+                                   self.name, self.max_queue, self.stats_counters['dropped'] + 1)
+                self.stats_counters['dropped'] += 1
+                self._ready.notify()
+                return
+
+            self._queue.append((time.monotonic(), item))
+            self.stats_counters['enqueued'] += 1
+            self.stats_counters['high_water'] = max(self.stats_counters['high_water'], len(self._queue))
+            # Wake the task when it has something to wait on, and when a batch is full
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._ready.notify()
+
+    def _take_batch(self):
+        with self._ready:
+            return [self._queue.popleft()[1] for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _write(self, items):
+        with self._write_lock:
+            started = time.monotonic()
+            for attempt in range(self.retries + 1):
+                try:
+                    # A fresh app context per attempt, so a failed one's session is rolled back
+                    with app.app_context(), sql_unit(f'write_behind:{self.name}', check_repeats=False):
+                        self.write_batch(items)
+                    break
+                except Exception:
+                    if attempt < self.retries:
+                        self.stats_counters['retried'] += 1
+                        logger.warning('%s: failed to write a batch of %d, retrying', self.name, len(items),
+                                       exc_info=True)
+                        socketio.sleep(self.retry_delay)
+                        continue
+                    self.stats_counters['failed'] += len(items)
+                    logger.exception('%s: failed to write a batch of %d, dropping it', self.name, len(items))
+                    return
+            self.stats_counters['written'] += len(items)
+            self.stats_counters['batches'] += 1
+            self.stats_counters['last_batch_seconds'] = time.monotonic() - started
+
+    def flush(self):
+        """Write everything queued so far, now."""
+        while True:
+            items = self._take_batch()
+            if not items:
+                return
+            self._write(items)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._queue:
+                    self._ready.wait()
+                # Wait for a full batch, but not past the oldest item's deadline
+                deadline = self._queue[0][0] + self.max_delay
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+            items = self._take_batch()
+            if items:
+                self._write(items)
+
+    def stats(self):
+        with self._ready:
+            oldest = time.monotonic() - self._queue[0][0] if self._queue else 0.0
+            return dict(self.stats_counters, queued=len(self._queue), oldest_seconds=oldest,
+                        max_queue=self.max_queue, max_batch=self.max_batch, max_delay=self.max_delay)